@@ -0,0 +1,238 @@
+"""
+File: batch_pipeline.py
+
+Description: Prepares training batches on background threads so the trainer
+doesn't wait for them. A shuffler thread deals out the (shuffled) record
+indices of every epoch, worker threads turn them into network inputs and
+targets (gathering the records, encoding them and applying one of the eight
+rotations and mirror images of the board to every position, at random) and put
+them on a bounded queue, and the trainer takes finished batches off the other
+end. Datasets only need one image of every position. The pipeline runs across
+epoch boundaries, so the first batches of an epoch are ready before the last
+ones of the previous epoch are trained on.
+
+The time the trainer spends waiting on the queue is measured ('stats'): if
+it isn't close to zero, add workers (numpy releases the GIL for most of the
+work, and so does the training step).
+
+NOTE: With more than one worker, batches can come out of order (and out of
+epoch, by a batch or two around the boundaries); the contents of every batch
+only depend on the seed.
+
+Usage: python batch_pipeline.py [packed data file] [workers=N]
+
+Compares the time to go through an epoch with and without the pipeline.
+"""
+
+import Queue
+import sys
+import threading
+import time
+
+import numpy
+
+import encoding
+import packed_dataset
+
+WORKERS = 2
+QUEUE_SIZE = 8  # Finished batches waiting for the trainer.
+STALL_THRESHOLD = 0.001  # Waits longer than this (in seconds) are stalls.
+POLL_INTERVAL = 0.1
+
+
+class BatchPipeline:
+    def __init__(self, records, batch_size, workers=WORKERS,
+                 queue_size=QUEUE_SIZE, augment=True, seed=None):
+        """
+        Background batch preparation.
+        :param records: numpy.array <- 'packed_dataset' records
+        :param batch_size: int <- positions per batch ('batch_size' can be
+            changed between epochs, it's read when an epoch is dealt out)
+        :param workers: int <- number of threads preparing batches
+        :param queue_size: int <- number of finished batches to keep ready
+        :param augment: bool <- apply a random symmetry to every position
+        :param seed: int <- seed of the shuffles and symmetries (or None)
+        """
+
+        self.records = records
+        self.batch_size = batch_size
+        self.augment = augment
+        self.seed = seed
+
+        self.tasks = Queue.Queue(maxsize=queue_size)
+        self.batches = Queue.Queue(maxsize=queue_size)
+        self.stopped = threading.Event()
+        self.error = None
+
+        self.threads = [threading.Thread(target=self._deal)]
+        self.threads += [threading.Thread(target=self._work)
+                         for _ in xrange(workers)]
+        for thread in self.threads:
+            thread.daemon = True
+
+        self.reset_stats()
+
+    def start(self):
+        for thread in self.threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        for thread in self.threads:
+            thread.join()
+
+    def _put(self, queue, item):
+        while not self.stopped.is_set():
+            try:
+                queue.put(item, timeout=POLL_INTERVAL)
+                return True
+            except Queue.Full:
+                pass
+        return False
+
+    def _get(self, queue):
+        while not self.stopped.is_set():
+            try:
+                return queue.get(timeout=POLL_INTERVAL)
+            except Queue.Empty:
+                pass
+        return None
+
+    def _random_state(self, *key):
+        if self.seed is None:
+            return numpy.random.RandomState()
+        return numpy.random.RandomState((self.seed,) + key)
+
+    def _deal(self):
+        epoch = 0
+        while not self.stopped.is_set():
+            order = self._random_state(epoch).permutation(len(self.records))
+            batch_size = self.batch_size
+            for number, n in enumerate(xrange(0, len(order), batch_size)):
+                # Sorted, so the records are read from the file in order.
+                indices = numpy.sort(order[n: n + batch_size])
+                if not self._put(self.tasks, (epoch, number, indices)):
+                    return
+            epoch += 1
+
+    def _work(self):
+        while not self.stopped.is_set():
+            task = self._get(self.tasks)
+            if task is None:
+                return
+            epoch, number, indices = task
+
+            start_time = time.time()
+            try:
+                batch = self.records[indices]
+                inputs = packed_dataset.to_input(batch)
+                outputs = packed_dataset.to_output(batch)
+                if self.augment:
+                    transforms = self._random_state(epoch, number).randint(
+                        len(encoding.SYMMETRIES), size=len(inputs))
+                    encoding.transform_inputs(inputs, transforms)
+            except Exception as error:
+                self.error = error
+                self._put(self.batches, None)
+                return
+
+            self.prepare_time += time.time() - start_time
+            self._put(self.batches, (epoch, inputs, outputs))
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        """
+        Waits for the next batch.
+        :return: tuple -> (epoch, inputs, outputs)
+        """
+
+        start_time = time.time()
+        item = self._get(self.batches)
+        waited = time.time() - start_time
+
+        if item is None:
+            if self.error is not None:
+                raise self.error
+            raise StopIteration
+
+        self.batches_taken += 1
+        self.wait_time += waited
+        self.max_wait = max(self.max_wait, waited)
+        if waited > STALL_THRESHOLD:
+            self.stalls += 1
+        return item
+
+    def reset_stats(self):
+        self.batches_taken = 0
+        self.stalls = 0
+        self.wait_time = 0.0
+        self.max_wait = 0.0
+        self.prepare_time = 0.0
+        self.stats_start = time.time()
+
+    def stats(self):
+        """
+        Describes how long the trainer waited for batches.
+        :return: dict <- "batches", "stalls" (waits over 'STALL_THRESHOLD'),
+            "wait_time" and "max_wait" (seconds), "stall_fraction" (of the
+            time since the last reset) and "prepare_time" (worker seconds)
+        """
+
+        elapsed = time.time() - self.stats_start
+        return {
+            "batches": self.batches_taken,
+            "stalls": self.stalls,
+            "wait_time": self.wait_time,
+            "max_wait": self.max_wait,
+            "stall_fraction": self.wait_time / elapsed if elapsed else 0.0,
+            "prepare_time": self.prepare_time,
+        }
+
+    def report(self):
+        stats = self.stats()
+        return ("{} batches :: {} stalls :: waited {} s ({}% of the time, "
+                "longest {} ms)".format(
+                    stats["batches"], stats["stalls"],
+                    round(stats["wait_time"], 3),
+                    round(100 * stats["stall_fraction"], 2),
+                    round(1000 * stats["max_wait"], 1)))
+
+
+if __name__ == "__main__":
+    import neural_network
+
+    workers = WORKERS
+    for argument in sys.argv[2:]:
+        attribute, value = argument.split("=")
+        if attribute == "workers":
+            workers = int(value)
+
+    records = packed_dataset.load(sys.argv[1])
+    brain = neural_network.NeuralNetwork(input_layer_size=130,
+                                         hidden_layer_sizes=(256, 256, 64),
+                                         output_layer_size=1)
+    batch_size = 256
+    batch_count = (len(records) + batch_size - 1) // batch_size
+
+    start_time = time.time()
+    order = numpy.random.permutation(len(records))
+    for n in xrange(0, len(records), batch_size):
+        batch = records[numpy.sort(order[n: n + batch_size])]
+        inputs = packed_dataset.to_input(batch)
+        transforms = numpy.random.randint(len(encoding.SYMMETRIES),
+                                          size=len(inputs))
+        encoding.transform_inputs(inputs, transforms)
+        brain.train(inputs, packed_dataset.to_output(batch), iterations=1)
+    print "In sequence: {} s".format(round(time.time() - start_time, 3))
+
+    pipeline = BatchPipeline(records, batch_size, workers=workers).start()
+    start_time = time.time()
+    for _ in xrange(batch_count):
+        _, inputs, outputs = pipeline.next()
+        brain.train(inputs, outputs, iterations=1)
+    print "Pipelined: {} s".format(round(time.time() - start_time, 3))
+    print pipeline.report()
+    pipeline.stop()
@@ -0,0 +1,350 @@
+#! /usr/bin/python
+
+"""
+File: benchmark_evaluators.py
+
+Description: Times every evaluator per stage of the game (buckets of
+empties), one position at a time and in batches, and checks how well each one
+agrees with the Edax labels of the training data. The results are written as
+JSON.
+
+Single evaluations are timed the way a search makes them, along the moves of
+seeded random games: every position is a copy of the one before with a move
+played, then evaluated, and all of that is timed, so the trackers some
+evaluators keep on the board are copied and updated within the time, like
+the work 'ab' does from scratch. The same steps without an evaluator are
+reported as "baseline".
+
+Batches and the agreement use a seeded sample of the data file when there is
+one (with labels), or the positions of seeded random games otherwise
+(without). An evaluator fitted on the sampled data file ('FITTED_ON') has its
+agreement flagged "in_sample", as it isn't comparable with the others.
+
+Usage: python benchmark_evaluators.py [attribute=value ...]
+
+  evaluators=ab,nn,...  evaluators to run (default: all of 'EVALUATORS')
+  positions=N           positions per bucket (default: 'POSITIONS_PER_BUCKET')
+  games=N               games to time single evaluations on (default: 'GAMES')
+  data=FILE             data file to sample (default: 'DATA_FILE')
+  output=FILE           JSON file to write (default: standard output)
+"""
+
+import copy
+import json
+import math
+import os
+import random
+import sys
+import time
+
+import numpy
+
+import bitboard
+import datafile_manager
+import evaluator_ab
+import evaluator_hybrid
+import evaluator_nn
+import evaluator_pattern
+import evaluator_test
+import fit_patterns
+import reversi
+
+DATA_FILE = "training_data_catered.txt"
+POSITIONS_PER_BUCKET = 200
+GAMES = 20
+BUCKET_SIZE = 10  # Empties per bucket.
+REPEATS = 3
+BATCH_SIZE = 64
+SEED = 0
+
+# name -> (single position evaluator, batch evaluator or None)
+EVALUATORS = {
+    "ab": (evaluator_ab.evaluate, None),
+    "nn": (evaluator_nn.evaluate, evaluator_nn.evaluate_batch),
+    "test": (evaluator_test.evaluate, evaluator_test.evaluate_batch),
+    "hybrid": (evaluator_hybrid.evaluate, evaluator_hybrid.evaluate_batch),
+    "pattern": (evaluator_pattern.evaluate, None),
+}
+
+# name -> data file the evaluator was fitted on.
+FITTED_ON = {
+    "pattern": fit_patterns.DATA_FILE,
+}
+
+
+def printf(s):
+    sys.stderr.write(s)
+    sys.stderr.flush()
+
+
+def empties(board):
+    black, white = bitboard.from_board(board)
+    return 64 - bitboard.popcount(black | white)
+
+
+def bucket_of(board):
+    # The start position (60 empties) goes with the 50s.
+    return min(empties(board), 59) // BUCKET_SIZE * BUCKET_SIZE
+
+
+def random_games(count, seed=SEED):
+    """
+    Plays seeded random games.
+    :param count: int <- number of games
+    :param seed: int <- random seed
+    :return: list <- lists of the moves of every game (None for a pass)
+    """
+
+    generator = random.Random(seed)
+    games = []
+    for _ in xrange(count):
+        board = reversi.Board()
+        moves = []
+        passes = 0
+        while passes < 2:
+            move = generator.choice(board.legal_moves_notation)
+            passes = passes + 1 if move is None else 0
+            board.move(move)
+            moves.append(move)
+        games.append(moves)
+    return games
+
+
+def random_positions(count, seed=SEED):
+    """
+    Plays seeded random games for positions.
+    :param count: int <- number of positions
+    :param seed: int <- random seed
+    :return: list <- position strings
+    """
+
+    generator = random.Random(seed)
+    positions = []
+    while len(positions) < count:
+        board = reversi.Board()
+        passes = 0
+        while passes < 2:
+            positions.append(board.get_pieces())
+            move = generator.choice(board.legal_moves_notation)
+            passes = passes + 1 if move is None else 0
+            board.move(move)
+    return positions
+
+
+def load_corpus(filename=DATA_FILE, per_bucket=POSITIONS_PER_BUCKET,
+                seed=SEED):
+    """
+    Builds the benchmark positions.
+    :param filename: str <- data file to sample
+    :param per_bucket: int <- positions per bucket of empties
+    :param seed: int <- random seed
+    :return: dict <- bucket (lowest empties) -> list of (board, label or None)
+    """
+
+    try:
+        data = datafile_manager.load_data(filename)
+        positions = sorted(data.keys())
+        source = "data"
+    except IOError:
+        data = {}
+        positions = sorted(set(random_positions(100 * per_bucket, seed)))
+        source = "random games"
+    random.Random(seed).shuffle(positions)
+
+    buckets = {}
+    for position in positions:
+        board = reversi.from_string(position)
+        bucket = bucket_of(board)
+        entries = buckets.setdefault(bucket, [])
+        if len(entries) < per_bucket:
+            entries.append((board, data.get(position)))
+
+    printf("Corpus from {}: {}\n".format(source, ", ".join(
+        "{}+ empties: {}".format(bucket, len(buckets[bucket]))
+        for bucket in sorted(buckets))))
+    return buckets
+
+
+def percentile(values, q):
+    return float(numpy.percentile(values, q)) if len(values) else None
+
+
+def agreement(scores, labels):
+    """
+    Compares the scores with the labels (win probabilities for black).
+    :return: dict <- "sign" (fraction on the same side) and "rank" (rank
+        correlation), or None without labels
+    """
+
+    pairs = [(score, label) for score, label in zip(scores, labels)
+             if label is not None and label != 0.5]
+    if len(pairs) < 2:
+        return None
+
+    scores, labels = map(numpy.array, zip(*pairs))
+    same_side = numpy.mean((scores > 0) == (labels > 0.5))
+
+    score_ranks = numpy.argsort(numpy.argsort(scores))
+    label_ranks = numpy.argsort(numpy.argsort(labels))
+    rank = numpy.corrcoef(score_ranks, label_ranks)[0, 1]
+    if math.isnan(rank):
+        rank = None
+    else:
+        rank = float(rank)
+
+    return {"sign": float(same_side), "rank": rank}
+
+
+def time_incremental(evaluate, games):
+    """
+    Times copying the board, playing a move (updating the trackers) and
+    evaluating, along every game.
+    :param evaluate: function <- evaluator (or None for just the moves)
+    :param games: list <- move lists from 'random_games'
+    :return: dict <- bucket -> list of latencies in seconds
+    """
+
+    latencies = {}
+    for _ in xrange(REPEATS):
+        for moves in games:
+            board = reversi.Board()
+            if evaluate is not None:
+                evaluate(board)  # Builds the trackers.
+            for move in moves:
+                start_time = time.time()
+                board = copy.deepcopy(board)
+                board.move(move)
+                if evaluate is not None:
+                    evaluate(board)
+                elapsed = time.time() - start_time
+                latencies.setdefault(bucket_of(board), []).append(elapsed)
+    return latencies
+
+
+def single_result(latencies):
+    return {
+        "evaluations_per_second": len(latencies) / sum(latencies),
+        "p50_us": 10 ** 6 * percentile(latencies, 50),
+        "p99_us": 10 ** 6 * percentile(latencies, 99),
+    }
+
+
+def time_batched(evaluate_batch, boards):
+    start_time = time.time()
+    for _ in xrange(REPEATS):
+        for n in xrange(0, len(boards), BATCH_SIZE):
+            evaluate_batch(boards[n: n + BATCH_SIZE])
+    return time.time() - start_time
+
+
+def benchmark(name, buckets, games, in_sample=False):
+    """
+    Benchmarks one evaluator on every bucket.
+    :param name: str <- key of 'EVALUATORS' (or "baseline")
+    :param buckets: dict <- from 'load_corpus'
+    :param games: list <- move lists from 'random_games'
+    :param in_sample: bool <- whether the evaluator was fitted on the corpus
+    :return: dict <- results per bucket (and over all of them)
+    """
+
+    if name == "baseline":
+        evaluate = evaluate_batch = None
+    else:
+        evaluate, evaluate_batch = EVALUATORS[name]
+    timings = time_incremental(evaluate, games)
+    results = {}
+    all_latencies = []
+    all_scores = []
+    all_labels = []
+
+    for bucket in sorted(set(buckets) | set(timings)):
+        boards = [board for board, _ in buckets.get(bucket, [])]
+        labels = [label for _, label in buckets.get(bucket, [])]
+        latencies = timings.get(bucket, [])
+
+        scores = []
+        if evaluate is not None:
+            scores = map(evaluate, boards)
+        result = {
+            "positions": len(boards),
+            "single": single_result(latencies) if latencies else None,
+            "batched": None,
+            "agreement": agreement(scores, labels),
+        }
+        if result["agreement"] is not None:
+            result["agreement"]["in_sample"] = in_sample
+
+        if evaluate_batch is not None and boards:
+            evaluate_batch(boards[:BATCH_SIZE])
+            elapsed = time_batched(evaluate_batch, boards)
+            result["batched"] = {
+                "batch_size": BATCH_SIZE,
+                "evaluations_per_second": REPEATS * len(boards) / elapsed,
+            }
+
+        results["{}-{}".format(bucket, bucket + BUCKET_SIZE - 1)] = result
+        all_latencies += latencies
+        all_scores += scores
+        all_labels += labels
+
+        if latencies:
+            printf("{} :: {}+ empties :: {} evaluations/sec\n".format(
+                name, bucket,
+                int(result["single"]["evaluations_per_second"])))
+
+    results["all"] = {
+        "positions": len(all_scores),
+        "single": single_result(all_latencies),
+        "agreement": agreement(all_scores, all_labels),
+    }
+    if results["all"]["agreement"] is not None:
+        results["all"]["agreement"]["in_sample"] = in_sample
+    return results
+
+
+if __name__ == "__main__":
+    names = sorted(EVALUATORS)
+    per_bucket = POSITIONS_PER_BUCKET
+    game_count = GAMES
+    output = None
+    for argument in sys.argv[1:]:
+        attribute, value = argument.split("=")
+        if attribute == "evaluators":
+            names = value.split(",")
+        elif attribute == "positions":
+            per_bucket = int(value)
+        elif attribute == "games":
+            game_count = int(value)
+        elif attribute == "data":
+            DATA_FILE = value
+        elif attribute == "output":
+            output = value
+
+    for name in names:
+        if name not in EVALUATORS:
+            printf("Unknown evaluator '{}', quitting... \n".format(name))
+            exit(1)
+
+    corpus = load_corpus(DATA_FILE, per_bucket)
+    timed_games = random_games(game_count)
+    fitted_on = {name: os.path.abspath(filename)
+                 for name, filename in FITTED_ON.items()}
+    report = {
+        "seed": SEED,
+        "positions_per_bucket": per_bucket,
+        "games": game_count,
+        "repeats": REPEATS,
+        "baseline": benchmark("baseline", corpus, timed_games),
+        "evaluators": {name: benchmark(
+            name, corpus, timed_games,
+            in_sample=fitted_on.get(name) == os.path.abspath(DATA_FILE))
+            for name in names},
+    }
+
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if output is None:
+        print text
+    else:
+        f = open(output, "w")
+        f.write(text + "\n")
+        f.close()
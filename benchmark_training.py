@@ -0,0 +1,132 @@
+#! /usr/bin/python
+
+"""
+File: benchmark_training.py
+
+Description: Times the training step ('NeuralNetwork.train') against the
+original one ('NeuralNetwork.train_legacy') on the same batches, starting from
+the same weights, and reports samples per second and the accuracy each one
+reached (they only differ by float32 rounding and the dropout draws).
+
+Usage: python benchmark_training.py [attribute=value ...]
+
+  data=FILE         packed (or text) data file (default: random positions)
+  batch_size=N      positions per batch (default: 'BATCH_SIZE')
+  steps=N           training steps per run (default: 'STEPS')
+  dropout=P         dropout percentage (default: 'DROPOUT_PERCENTAGE')
+"""
+
+import copy
+import sys
+import time
+
+import numpy
+
+import encoding
+import neural_network
+import packed_dataset
+
+BATCH_SIZE = 256
+STEPS = 200
+HIDDEN_LAYERS = (256, 256, 64)
+
+ALPHA = 0.0016
+BETA = 0.5
+DROPOUT_PERCENTAGE = 0.5
+
+SEED = 0
+
+
+def random_batches(batch_size, count, seed=SEED):
+    generator = numpy.random.RandomState(seed)
+    batches = []
+    for _ in xrange(count):
+        squares = generator.randint(3, size=(batch_size, 64))
+        inputs = numpy.zeros((batch_size, encoding.INPUT_SIZE),
+                             dtype=numpy.float32)
+        inputs[:, :128] = encoding.PIECE_INPUTS[squares].reshape(batch_size,
+                                                                 128)
+        inputs[:, 128:] = encoding.PIECE_INPUTS[generator.randint(
+            2, size=batch_size)]
+        outputs = generator.rand(batch_size, 1).astype(numpy.float32)
+        batches.append((inputs, outputs))
+    return batches
+
+
+def data_batches(records, batch_size, count, seed=SEED):
+    order = numpy.random.RandomState(seed).permutation(len(records))
+    batches = []
+    for n in xrange(count):
+        start = n * batch_size % max(len(records) - batch_size, 1)
+        batch = records[numpy.sort(order[start: start + batch_size])]
+        batches.append((packed_dataset.to_input(batch),
+                        packed_dataset.to_output(batch)))
+    return batches
+
+
+def run(train, batches, dropout_percentage):
+    """
+    Trains on every batch once.
+    :param train: function <- bound 'train' or 'train_legacy'
+    :param batches: list <- (inputs, outputs) pairs
+    :param dropout_percentage: float <- dropout percentage
+    :return: tuple -> (samples per second, mean accuracy of the last tenth
+        of the steps)
+    """
+
+    # Warm up (buffers, float32 copies).
+    train(batches[0][0], batches[0][1], iterations=1, alpha=0.,
+          beta=BETA, dropout_percentage=dropout_percentage)
+
+    samples = 0
+    accuracies = []
+    start_time = time.time()
+    for inputs, outputs in batches:
+        accuracies.append(train(inputs, outputs, iterations=1, alpha=ALPHA,
+                                beta=BETA,
+                                dropout_percentage=dropout_percentage))
+        samples += len(inputs)
+    elapsed = time.time() - start_time
+    return samples / elapsed, numpy.mean(accuracies[-max(len(accuracies) // 10,
+                                                        1):])
+
+
+if __name__ == "__main__":
+    data_file = None
+    batch_size = BATCH_SIZE
+    steps = STEPS
+    dropout_percentage = DROPOUT_PERCENTAGE
+    for argument in sys.argv[1:]:
+        attribute, value = argument.split("=")
+        if attribute == "data":
+            data_file = value
+        elif attribute == "batch_size":
+            batch_size = int(value)
+        elif attribute == "steps":
+            steps = int(value)
+        elif attribute == "dropout":
+            dropout_percentage = float(value)
+
+    if data_file is None:
+        batches = random_batches(batch_size, steps)
+    else:
+        batches = data_batches(packed_dataset.load(data_file), batch_size,
+                               steps)
+
+    numpy.random.seed(SEED)
+    legacy_brain = neural_network.NeuralNetwork(
+        input_layer_size=encoding.INPUT_SIZE, hidden_layer_sizes=HIDDEN_LAYERS,
+        output_layer_size=1)
+    brain = copy.deepcopy(legacy_brain)
+
+    legacy_speed, legacy_accuracy = run(legacy_brain.train_legacy, batches,
+                                        dropout_percentage)
+    speed, accuracy = run(brain.train, batches, dropout_percentage)
+
+    print "{} steps of {} positions, layers {}, dropout {}".format(
+        steps, batch_size, HIDDEN_LAYERS, dropout_percentage)
+    print "train_legacy :: {} samples/sec :: accuracy {}%".format(
+        int(legacy_speed), round(legacy_accuracy, 2))
+    print "train        :: {} samples/sec :: accuracy {}%".format(
+        int(speed), round(accuracy, 2))
+    print "Speedup: {}x".format(round(speed / legacy_speed, 2))
@@ -0,0 +1,218 @@
+"""
+File: bitboard.py
+
+Description: Helpers for working with a position as two 64-bit integers (one
+per side) instead of the 2d 'pieces' list. Square (row, column) is bit
+'row * 8 + column', so a1 is bit 0 and h8 is bit 63.
+"""
+
+EMPTY = 2
+BLACK = 0
+WHITE = 1
+
+FULL = (1 << 64) - 1
+NOT_FIRST_COLUMN = 0xfefefefefefefefe
+NOT_LAST_COLUMN = 0x7f7f7f7f7f7f7f7f
+
+# (shift, mask) for the eight directions; positive shifts are left shifts.
+DIRECTIONS = (
+    (1, NOT_FIRST_COLUMN),
+    (-1, NOT_LAST_COLUMN),
+    (8, FULL),
+    (-8, FULL),
+    (9, NOT_FIRST_COLUMN),
+    (7, NOT_LAST_COLUMN),
+    (-7, NOT_FIRST_COLUMN),
+    (-9, NOT_LAST_COLUMN),
+)
+
+_ROW_MASKS = {}
+
+
+def shift(x, amount, mask):
+    if amount > 0:
+        return (x << amount) & mask & FULL
+    return (x >> -amount) & mask
+
+
+def popcount(x):
+    return bin(x).count("1")
+
+
+def _row_masks(row):
+    black = white = 0
+    for column, piece in enumerate(row):
+        if piece == BLACK:
+            black |= 1 << column
+        elif piece == WHITE:
+            white |= 1 << column
+    return black, white
+
+
+def from_pieces(pieces):
+    """
+    Converts a 2d 'pieces' list into bitboards.
+    :param pieces: 2d list <- arrangement of pieces on the board
+    :return: tuple -> (black, white)
+    """
+
+    black = white = 0
+    for row_index, row in enumerate(pieces):
+        key = tuple(row)
+        try:
+            row_black, row_white = _ROW_MASKS[key]
+        except KeyError:
+            row_black, row_white = _ROW_MASKS[key] = _row_masks(key)
+        black |= row_black << (8 * row_index)
+        white |= row_white << (8 * row_index)
+    return black, white
+
+
+def from_board(board):
+    return from_pieces(board.pieces)
+
+
+def from_string(position):
+    """
+    Converts a position string (as from 'Board.get_pieces') into bitboards.
+    :param position: str <- 64 squares of "X", "O" or "-" and the side to move
+    :return: tuple -> (black, white, side)
+    """
+
+    black = white = 0
+    for square in xrange(64):
+        if position[square] == "X":
+            black |= 1 << square
+        elif position[square] == "O":
+            white |= 1 << square
+    return black, white, BLACK if position[64] == "X" else WHITE
+
+
+def legal_moves(own, opponent):
+    """
+    Finds the legal moves of the side owning 'own'.
+    :param own: int <- bitboard of the side to move
+    :param opponent: int <- bitboard of the other side
+    :return: int <- bitboard of the squares that can be played
+    """
+
+    empty = ~(own | opponent) & FULL
+    moves = 0
+    for amount, mask in DIRECTIONS:
+        inner = opponent & mask
+        x = shift(own, amount, inner)
+        x |= shift(x, amount, inner)
+        x |= shift(x, amount, inner)
+        x |= shift(x, amount, inner)
+        x |= shift(x, amount, inner)
+        x |= shift(x, amount, inner)
+        moves |= shift(x, amount, mask) & empty
+    return moves
+
+
+def flips(own, opponent, square):
+    """
+    Finds the discs flipped by playing 'square'.
+    :param own: int <- bitboard of the side to move
+    :param opponent: int <- bitboard of the other side
+    :param square: int <- index of the square played
+    :return: int <- bitboard of the flipped discs
+    """
+
+    move = 1 << square
+    flipped = 0
+    for amount, mask in DIRECTIONS:
+        line = 0
+        x = shift(move, amount, mask)
+        while x & opponent:
+            line |= x
+            x = shift(x, amount, mask)
+        if x & own:
+            flipped |= line
+    return flipped
+
+
+def neighbours(x):
+    """
+    Finds every square next to a square in 'x'.
+    :param x: int <- bitboard
+    :return: int <- bitboard of the neighbouring squares
+    """
+
+    result = 0
+    for amount, mask in DIRECTIONS:
+        result |= shift(x, amount, mask)
+    return result
+
+
+def _double(mask):
+    return mask | (mask << 64)
+
+
+# Masks of the eight symmetries for two bitboards packed into one integer
+# ('black | white << 64'), so that both are transformed at once.
+_V1, _V2, _V3 = map(_double, (0x00ff00ff00ff00ff, 0x0000ffff0000ffff,
+                               0x00000000ffffffff))
+_H1, _H2, _H3 = map(_double, (0x5555555555555555, 0x3333333333333333,
+                               0x0f0f0f0f0f0f0f0f))
+_D1, _D2, _D3 = map(_double, (0x0f0f0f0f00000000, 0x3333000033330000,
+                               0x5500550055005500))
+
+
+def canonical(black, white):
+    """
+    Finds the smallest of the eight symmetric images of a position, so that
+    symmetric positions have the same key.
+    :param black: int <- bitboard of the black discs
+    :param white: int <- bitboard of the white discs
+    :return: int <- the canonical image packed as 'black | white << 64'
+    """
+
+    x = black | (white << 64)
+
+    t = _D1 & (x ^ (x << 28))
+    t = x ^ t ^ (t >> 28)
+    u = _D2 & (t ^ (t << 14))
+    t ^= u ^ (u >> 14)
+    u = _D3 & (t ^ (t << 7))
+    transposed = t ^ u ^ (u >> 7)
+
+    images = []
+    for x in (x, transposed):
+        v = ((x >> 8) & _V1) | ((x & _V1) << 8)
+        v = ((v >> 16) & _V2) | ((v & _V2) << 16)
+        v = ((v >> 32) & _V3) | ((v & _V3) << 32)
+        for y in (x, v):
+            h = ((y >> 1) & _H1) | ((y & _H1) << 1)
+            h = ((h >> 2) & _H2) | ((h & _H2) << 2)
+            h = ((h >> 4) & _H3) | ((h & _H3) << 4)
+            images.append(y)
+            images.append(h)
+    return min(images)
+
+
+def to_string(black, white, side):
+    """
+    Converts bitboards into a position string (the inverse of 'from_string').
+    :param black: int <- bitboard of the black discs
+    :param white: int <- bitboard of the white discs
+    :param side: int <- side to move
+    :return: str <- 64 squares of "X", "O" or "-" and the side to move
+    """
+
+    squares = ["X" if black >> square & 1 else "O" if white >> square & 1
+               else "-" for square in xrange(64)]
+    return "".join(squares) + ("X" if side == BLACK else "O")
+
+
+def canonical_string(position):
+    """
+    Finds the canonical image (see 'canonical') of a position string. The side
+    to move stays the same, so the image has the same score.
+    :param position: str <- position string (as from 'Board.get_pieces')
+    :return: str <- position string of the canonical image
+    """
+
+    black, white, side = from_string(position)
+    packed = canonical(black, white)
+    return to_string(packed & FULL, packed >> 64, side)
@@ -0,0 +1,150 @@
+"""
+File: checkpoint.py
+
+Description: Saves training checkpoints without stopping training. 'save'
+only copies the weights (a snapshot, so training can carry on changing them)
+and queues it; a background thread writes the snapshot as a weights file (see
+'weightsfile_manager.py': the weights and a little metadata, no velocities or
+other training state) to a temporary file and renames it into place, so a
+checkpoint file is always complete, whenever it's read (eg. by 'validate.py')
+or however training stops.
+
+Filenames can contain "{iteration}" (filled in with the zero padded
+iteration) to keep a series of checkpoints, of which only the newest 'keep'
+are kept.
+
+The time the trainer spends in 'save' (copying, and waiting when
+'MAX_PENDING' checkpoints are already queued) is measured ('stats').
+"""
+
+import glob
+import os
+import Queue
+import threading
+import time
+
+import numpy
+
+import neural_network
+
+MAX_PENDING = 2
+ITERATION_DIGITS = 9
+
+
+class CheckpointWriter:
+    def __init__(self, max_pending=MAX_PENDING):
+        """
+        Background checkpoint writer.
+        :param max_pending: int <- checkpoints which can be queued before
+            'save' waits for the writer
+        """
+
+        self.queue = Queue.Queue(maxsize=max_pending)
+        self.error = None
+
+        self.checkpoints = 0
+        self.stall_time = 0.0
+        self.max_stall = 0.0
+        self.write_time = 0.0
+
+        self.thread = threading.Thread(target=self._write)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def save(self, brain, filename, keep=None):
+        """
+        Queues a checkpoint of a network.
+        :param brain: neural_network.NeuralNetwork() <- network to save
+        :param filename: str <- file to write (can contain "{iteration}")
+        :param keep: int <- number of files of the series to keep (or None to
+            keep them all)
+        :return: str <- the file the checkpoint is written to
+        """
+
+        if self.error is not None:
+            raise self.error
+
+        start_time = time.time()
+
+        snapshot = neural_network.NeuralNetwork(
+            weights_list=[numpy.array(weights, dtype=numpy.float32)
+                          for weights in brain.weights_list])
+        snapshot.iteration = brain.iteration
+        snapshot.error = brain.error
+
+        # Glob pattern matching every file of the series.
+        series = filename.format(iteration="?" * ITERATION_DIGITS)
+        filename = filename.format(
+            iteration=str(brain.iteration).zfill(ITERATION_DIGITS))
+        self.queue.put((snapshot, filename, series, keep))
+
+        stall = time.time() - start_time
+        self.checkpoints += 1
+        self.stall_time += stall
+        self.max_stall = max(self.max_stall, stall)
+        return filename
+
+    def _write(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                self.queue.task_done()
+                return
+            snapshot, filename, series, keep = item
+
+            start_time = time.time()
+            try:
+                directory = os.path.dirname(filename)
+                if directory and not os.path.isdir(directory):
+                    os.makedirs(directory)
+
+                temporary = filename + ".tmp"
+                snapshot.save(temporary)
+                os.rename(temporary, filename)
+
+                if keep is not None and series != filename:
+                    for old in sorted(glob.glob(series))[:-keep]:
+                        os.remove(old)
+            except Exception as error:
+                self.error = error
+
+            self.write_time += time.time() - start_time
+            self.queue.task_done()
+
+    def flush(self):
+        """
+        Waits for every queued checkpoint to be written.
+        :return: None
+        """
+
+        self.queue.join()
+        if self.error is not None:
+            raise self.error
+
+    def close(self):
+        self.flush()
+        self.queue.put(None)
+        self.thread.join()
+
+    def stats(self):
+        """
+        Describes the cost of the checkpoints so far.
+        :return: dict <- "checkpoints", "stall_time" and "max_stall" (seconds
+            the trainer spent in 'save') and "write_time" (seconds the writer
+            spent writing)
+        """
+
+        return {
+            "checkpoints": self.checkpoints,
+            "stall_time": self.stall_time,
+            "max_stall": self.max_stall,
+            "write_time": self.write_time,
+        }
+
+    def report(self):
+        stats = self.stats()
+        return ("{} checkpoints :: stalled {} ms (longest {} ms) :: written "
+                "in the background in {} ms".format(
+                    stats["checkpoints"], round(1000 * stats["stall_time"], 1),
+                    round(1000 * stats["max_stall"], 1),
+                    round(1000 * stats["write_time"], 1)))
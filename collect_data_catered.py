@@ -14,8 +14,7 @@ import math
 import sys
 import random
 
-import numpy
-
+import bitboard
 import datafile_manager
 import edax_wrapper
 import reversi
@@ -32,30 +31,6 @@ RANDOM_ARRAY = RANDOM_PERCENTAGE * [1] + (100 - RANDOM_PERCENTAGE) * [0]
 # DATA_FILE, TEST_FILE = TEST_FILE, DATA_FILE
 
 
-CONVERSION_CHART = {
-    "X": 0,
-    "O": 1,
-    "-": 2
-}
-
-CONVERSION_CHART2 = {
-    0: "X",
-    1: "O",
-    2: "-"
-}
-
-
-def rotate(pieces):
-    converted = [[]] * 8
-    for row in xrange(8):
-        converted[row] = [int(CONVERSION_CHART[piece])
-                          for piece in str(pieces[row * 8: row * 8 + 8])]
-    converted = numpy.rot90(numpy.array(converted))
-    converted = "".join(CONVERSION_CHART2[piece]
-                        for row in converted for piece in row)
-    return converted + pieces[-1]
-
-
 def sigmoid(x):
     return 1 / (1 + math.exp(-x/2.0))
 
@@ -110,26 +85,23 @@ if __name__ == "__main__":
                     sys.stdout.write("Done.\n")
                     continue
 
-                augmented_positions = [position]
-                for _ in xrange(3):
-                    position = rotate(position)
-                    augmented_positions.append(position)
+                # Only one image of every position is stored, training applies
+                # the symmetries (see 'batch_pipeline.py').
+                position = bitboard.canonical_string(position)
+                if position not in data and position not in test:
+                    sys.stdout.write("Adding position: {}\n".format(position))
+                    data[position] = score
 
-                for position in augmented_positions:
-                    if position not in data.keys() + test.keys():
-                        sys.stdout.write("Adding position: {}\n".format(position))
-                        data[position] = score
+                    if len(data) % 1000 == 0:
+                        sys.stdout.write("{} entries, saving data... ".format(
+                            len(data)
+                        ))
 
-                        if len(data) % 1000 == 0:
-                            sys.stdout.write("{} entries, saving data... ".format(
-                                len(data)
-                            ))
+                        datafile_manager.save_data(data, DATA_FILE)
+                        sys.stdout.write("Done\n")
 
-                            datafile_manager.save_data(data, DATA_FILE)
-                            sys.stdout.write("Done\n")
-
-                    else:
-                        sys.stdout.write("Position already saved, continuing.\n")
+                else:
+                    sys.stdout.write("Position already saved, continuing.\n")
 
             sys.stdout.write("Resetting board... ")
             edax_wrapper.new_position()
@@ -0,0 +1,165 @@
+"""
+File: encoding.py
+
+Description: Conversion of positions into the 130 network inputs: two inputs
+per square ([1, 0] for black, [0, 1] for white and [0, 0] for empty) followed
+by two for the side to move ([1, 0] for black, [0, 1] for white). Positions can
+be boards, position strings (as from 'Board.get_pieces') or packed bitboards,
+one at a time or as a whole batch, and everything is done with lookup tables
+and numpy instead of per-square python.
+"""
+
+import numpy
+
+INPUT_SIZE = 130
+
+# Inputs of a square indexed by its piece (0 black, 1 white, 2 empty).
+PIECE_INPUTS = numpy.array([[1, 0], [0, 1], [0, 0]], dtype=numpy.float32)
+
+# Inputs of a square (or of the side to move) indexed by a string character.
+CHARACTER_INPUTS = numpy.zeros((256, 2), dtype=numpy.float32)
+CHARACTER_INPUTS[ord("X")] = [1, 0]
+CHARACTER_INPUTS[ord("O")] = [0, 1]
+SIDE_CHARACTER_INPUTS = numpy.tile(numpy.array([0, 1], dtype=numpy.float32),
+                                   (256, 1))
+SIDE_CHARACTER_INPUTS[ord("X")] = [1, 0]
+
+# Square permutations of the eight symmetries of the board: the four
+# rotations (as 'numpy.rot90') and the four rotations of the transposed board.
+# Square n of the transformed board is square 'SYMMETRIES[k][n]' of the
+# original.
+SYMMETRIES = numpy.array([numpy.rot90(squares, k).ravel()
+                          for squares in (numpy.arange(64).reshape(8, 8),
+                                          numpy.arange(64).reshape(8, 8).T)
+                          for k in xrange(4)], dtype=numpy.intp)
+ROTATIONS = SYMMETRIES[:4]
+
+
+def board_to_input(board):
+    """
+    Converts a board into network inputs.
+    :param board: reversi.Board() <- board to convert
+    :return: numpy.array <- (130,) float32 inputs
+    """
+
+    converted = numpy.empty(INPUT_SIZE, dtype=numpy.float32)
+    converted[:128] = PIECE_INPUTS[numpy.array(board.pieces, dtype=numpy.intp)
+                                   ].ravel()
+    converted[128:] = PIECE_INPUTS[board.side]
+    return converted
+
+
+def boards_to_input(boards):
+    """
+    Converts a batch of boards into network inputs.
+    :param boards: list <- reversi.Board() instances
+    :return: numpy.array <- (N, 130) float32 inputs
+    """
+
+    pieces = numpy.array([board.pieces for board in boards], dtype=numpy.intp)
+    sides = numpy.array([board.side for board in boards], dtype=numpy.intp)
+
+    converted = numpy.empty((len(boards), INPUT_SIZE), dtype=numpy.float32)
+    converted[:, :128] = PIECE_INPUTS[pieces].reshape(len(boards), 128)
+    converted[:, 128:] = PIECE_INPUTS[sides]
+    return converted
+
+
+def strings_to_input(positions):
+    """
+    Converts a batch of position strings into network inputs.
+    :param positions: list <- 65 character strings ("X", "O" or "-" for every
+        square, then "X" or "O" for the side to move)
+    :return: numpy.array <- (N, 130) float32 inputs
+    """
+
+    characters = numpy.frombuffer("".join(positions), dtype=numpy.uint8)
+    characters = characters.reshape(len(positions), 65)
+
+    converted = numpy.empty((len(positions), INPUT_SIZE), dtype=numpy.float32)
+    converted[:, :128] = CHARACTER_INPUTS[characters[:, :64]].reshape(
+        len(positions), 128)
+    converted[:, 128:] = SIDE_CHARACTER_INPUTS[characters[:, 64]]
+    return converted
+
+
+def string_to_input(position):
+    return strings_to_input([position])[0]
+
+
+def unpack_bitboards(bitboards):
+    """
+    Unpacks bitboards into one 0/1 value per square (bit n is square n).
+    :param bitboards: numpy.array <- (N,) uint64 bitboards
+    :return: numpy.array <- (N, 64) uint8 squares
+    """
+
+    bitboards = numpy.ascontiguousarray(bitboards, dtype="<u8")
+    bits = numpy.unpackbits(bitboards.view(numpy.uint8).reshape(-1, 8, 1),
+                            axis=2)
+    # 'unpackbits' gives the most significant bit of every byte first.
+    return bits[:, :, ::-1].reshape(-1, 64)
+
+
+def pack_squares(squares):
+    """
+    Packs one 0/1 value per square into bitboards (the inverse of
+    'unpack_bitboards').
+    :param squares: numpy.array <- (N, 64) squares
+    :return: numpy.array <- (N,) uint64 bitboards
+    """
+
+    squares = numpy.asarray(squares, dtype=numpy.uint8).reshape(-1, 8, 8)
+    packed = numpy.packbits(squares[:, :, ::-1], axis=2)
+    return numpy.ascontiguousarray(packed.reshape(-1, 8)).view("<u8").ravel()
+
+
+def bitboards_to_input(black, white, sides):
+    """
+    Converts a batch of packed positions into network inputs.
+    :param black: numpy.array <- (N,) uint64 bitboards of the black discs
+    :param white: numpy.array <- (N,) uint64 bitboards of the white discs
+    :param sides: numpy.array <- (N,) side to move (0 black, 1 white)
+    :return: numpy.array <- (N, 130) float32 inputs
+    """
+
+    converted = numpy.empty((len(sides), INPUT_SIZE), dtype=numpy.float32)
+    squares = converted[:, :128].reshape(len(sides), 64, 2)
+    squares[:, :, 0] = unpack_bitboards(black)
+    squares[:, :, 1] = unpack_bitboards(white)
+    converted[:, 128:] = PIECE_INPUTS[numpy.asarray(sides, dtype=numpy.intp)]
+    return converted
+
+
+def transform_inputs(inputs, transforms, table=SYMMETRIES):
+    """
+    Applies a symmetry to every position of a batch of inputs (in place).
+    :param inputs: numpy.array <- (N, 130) inputs
+    :param transforms: numpy.array <- (N,) row of 'table' for every position
+    :param table: numpy.array <- square permutations
+    :return: numpy.array <- the inputs
+    """
+
+    squares = inputs[:, :128].reshape(len(inputs), 64, 2)
+    squares[...] = squares[numpy.arange(len(inputs))[:, None],
+                           table[transforms]]
+    return inputs
+
+
+def board_to_indices(board):
+    """
+    Finds which of the inputs of a board are 1 (for sparse inference).
+    :param board: reversi.Board() <- board to convert
+    :return: list <- indices of the active inputs
+    """
+
+    indices = []
+    square = 0
+    for row in board.pieces:
+        for piece in row:
+            if piece != 2:
+                indices.append(square + piece)
+            square += 2
+
+    indices.append(square + board.side)
+    return indices
@@ -0,0 +1,161 @@
+"""
+File: evaluation_cache.py
+
+Description: Bounded least recently used cache of evaluations, keyed by the
+evaluator and the position folded over the eight symmetries of the board (so
+a position and its mirror images share an entry). Wrap an evaluator with
+'cached' and the wrapper can be used anywhere the evaluator was; all wrappers
+share 'SHARED_CACHE' by default, so the entries outlive single searches and
+games for as long as the process runs. Its size comes from a memory budget
+('MAX_MEMORY', see 'ENTRY_SIZE').
+
+NOTE: A cached score is returned as is, so evaluators with noise (see
+'NOISE_FACTOR') give the same score for a position until it's evicted, and
+evaluators which aren't symmetric should be wrapped with 'symmetric=False'.
+"""
+
+import collections
+import threading
+
+import bitboard
+
+# Rough bytes per entry (measured on python 2.7: the 'OrderedDict' links, the
+# key tuple with its long and the float score), so 10 ** 6 entries would take
+# about 400 MB in every process with a cache.
+ENTRY_SIZE = 400
+MAX_MEMORY = 16  # Megabytes per process.
+
+
+def entries_for_memory(megabytes):
+    """
+    Converts a memory budget to a (rough) number of entries for
+    'EvaluationCache'.
+    :param megabytes: float <- memory budget in megabytes
+    :return: int <- number of entries
+    """
+
+    return int(megabytes * 1024 * 1024 / ENTRY_SIZE)
+
+
+MAX_ENTRIES = entries_for_memory(MAX_MEMORY)
+
+
+class EvaluationCache:
+    def __init__(self, max_entries=MAX_ENTRIES):
+        """
+        Least recently used cache of evaluations.
+        :param max_entries: int <- number of entries to keep at most
+        """
+
+        self.max_entries = max_entries
+        self.entries = collections.OrderedDict()
+        # The searcher may be running on a 'search_thread' while the main
+        # thread evaluates too.
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        """
+        Looks up a key and marks it as recently used.
+        :param key: hashable <- key from 'key'
+        :return: the cached score <OR> None
+        """
+
+        with self.lock:
+            try:
+                # No 'move_to_end' in python 2, so pop and insert again.
+                score = self.entries.pop(key)
+            except KeyError:
+                self.misses += 1
+                return None
+            self.entries[key] = score
+            self.hits += 1
+            return score
+
+    def put(self, key, score):
+        with self.lock:
+            self.entries.pop(key, None)
+            self.entries[key] = score
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        if lookups == 0:
+            return 0.0
+        return float(self.hits) / lookups
+
+    def stats(self):
+        """
+        Gets the statistics of the cache since the last 'reset_stats'.
+        :return: dict <- hits, misses, evictions, hit rate and entries
+        """
+
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hit_rate(),
+            "entries": len(self.entries),
+        }
+
+    def reset_stats(self):
+        self.hits = self.misses = self.evictions = 0
+
+
+SHARED_CACHE = EvaluationCache()
+
+
+def key(board, evaluator_id, symmetric=True):
+    """
+    Builds the cache key of a position.
+    :param board: reversi.Board() <- position to look up
+    :param evaluator_id: hashable <- name of the evaluator
+    :param symmetric: bool <- whether to fold symmetric positions together
+    :return: tuple -> (evaluator id, side to move, packed position)
+    """
+
+    black, white = bitboard.from_board(board)
+    if symmetric:
+        return evaluator_id, board.side, bitboard.canonical(black, white)
+    return evaluator_id, board.side, black | (white << 64)
+
+
+def cached(evaluate, evaluator_id=None, cache=None, symmetric=True):
+    """
+    Wraps an evaluator so that its scores are looked up in a cache first.
+    :param evaluate: function <- evaluator taking a board
+    :param evaluator_id: hashable <- name of the evaluator in the keys
+        (defaults to the module and name of 'evaluate')
+    :param cache: EvaluationCache() <- cache to use (or 'SHARED_CACHE')
+    :param symmetric: bool <- whether symmetric positions share an entry
+    :return: function <- the wrapped evaluator
+    """
+
+    if cache is None:
+        cache = SHARED_CACHE
+    if evaluator_id is None:
+        evaluator_id = "{}.{}".format(evaluate.__module__, evaluate.__name__)
+
+    def cached_evaluate(board):
+        board_key = key(board, evaluator_id, symmetric)
+        score = cache.get(board_key)
+        if score is None:
+            score = evaluate(board)
+            cache.put(board_key, score)
+        return score
+
+    cached_evaluate.cache = cache
+    cached_evaluate.evaluator_id = evaluator_id
+    return cached_evaluate
@@ -1,10 +1,13 @@
 """
-File: evaluator_ab.py -- version 0.2.1
+File: evaluator_ab.py -- version 0.3.0
 
 Description: Evaluation module for evaluating a reversi board state... This was
-copied from an older program.
+copied from an older program. The board is converted to bitboards so nothing
+is mutated and mobility/frontier counting is a handful of shifts.
 """
 
+import bitboard
+
 EMPTY = 2
 
 MOBILITY_FACTOR = 10
@@ -22,84 +25,54 @@ piece_scores = [
     [199, -8, 8, 6, 6, 8, -8, 199],
 ]
 
-NOT_ALLOWED = frozenset([(x, y) for x in [-1, 8] for y in xrange(-1, 9)] +
-                        [(x, y) for x in xrange(8) for y in [-1, 8]])
-NOT_ALLOWED = {x: True for x in NOT_ALLOWED}
+# Piece-square sums for every byte of every row, indexed [row][byte].
+ROW_SCORES = [[sum(piece_scores[row][column] for column in xrange(8)
+                   if byte >> column & 1)
+               for byte in xrange(256)]
+              for row in xrange(8)]
 
-SIDE_FACTORS = {0: 1, 1: -1, 2: 0}
 
+def mobility_score(moves):
+    if moves == 0:
+        return -5 * MOBILITY_FACTOR
+    elif moves == 1:
+        return -MOBILITY_FACTOR
+    return MOBILITY_FACTOR * moves
 
-def evaluate(board):
-    pieces = board.pieces
 
-    if board.is_over():
-        score = board.score()
-        return 100 * (score[0] - score[1])
+def evaluate(board):
+    popcount = bitboard.popcount
+    black, white = bitboard.from_board(board)
 
-    score = 0
+    black_moves = popcount(bitboard.legal_moves(black, white))
+    white_moves = popcount(bitboard.legal_moves(white, black))
+    if black_moves == 0 and white_moves == 0:
+        return 100 * (popcount(black) - popcount(white))
 
     # Pieces and values...
-    empty_places = 0
-    colors = 0
+    empty_places = 64 - popcount(black | white)
+    colors = popcount(black) - popcount(white)
     positions = 0
-
-    for row_index in xrange(len(pieces)):
-        for column_index in xrange(len(pieces[row_index])):
-            if pieces[row_index][column_index] == 0:
-                colors += 1
-                positions += piece_scores[row_index][column_index]
-            elif pieces[row_index][column_index] == 1:
-                colors -= 1
-                positions -= piece_scores[row_index][column_index]
-            else:
-                empty_places += 1
+    for row in xrange(8):
+        positions += ROW_SCORES[row][black >> (8 * row) & 255]
+        positions -= ROW_SCORES[row][white >> (8 * row) & 255]
 
     position_value = min(1, 0.1 * empty_places)
     piece_value = 100 - 10 * empty_places
     piece_value = max(LESS_PIECE_FACTOR * piece_value, piece_value)
-    score += colors * piece_value
-
-    # Mobility...
-    temporary_score = 0
-    for _ in xrange(2):
-        board.move(None)
-        factor = SIDE_FACTORS[board.side]
-        if board.legal_moves == [None]:
-            temporary_score -= factor * 5 * MOBILITY_FACTOR
-        elif len(board.legal_moves) == 1:
-            temporary_score -= factor * MOBILITY_FACTOR
-        else:
-            temporary_score += factor * MOBILITY_FACTOR * \
-                               len(board.legal_moves)
-
-    temporary_score *= SIDE_FACTORS[board.side]
-    positions += temporary_score
+    score = colors * piece_value
+
+    # Mobility (from the point of view of the side to move)...
+    mobility = mobility_score(black_moves) - mobility_score(white_moves)
+    if board.side == 0:
+        positions += mobility
+    else:
+        positions -= mobility
 
     # Frontier minimization...
-    for rindex, row in enumerate(board.pieces):
-        for cindex, piece in enumerate(row):
-            if board.pieces[rindex][cindex] == EMPTY:
-                continue
-
-            side_factor = SIDE_FACTORS[board.pieces[rindex][cindex]]
-
-            around = (
-                (rindex - 1, cindex - 1),
-                (rindex - 1, cindex),
-                (rindex - 1, cindex + 1),
-                (rindex, cindex - 1),
-                (rindex, cindex + 1),
-                (rindex + 1, cindex - 1),
-                (rindex + 1, cindex),
-                (rindex + 1, cindex + 1)
-            )
-
-            for coordinate in around:
-                if coordinate in NOT_ALLOWED:
-                    continue
-                if board.pieces[coordinate[0]][coordinate[1]] == EMPTY:
-                    positions -= side_factor * FRONTIER_FACTOR
-                    break
+    frontier = bitboard.neighbours(~(black | white) & bitboard.FULL)
+    positions -= FRONTIER_FACTOR * (popcount(black & frontier) -
+                                    popcount(white & frontier))
 
     score += positions * position_value
 
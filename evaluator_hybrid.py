@@ -1,8 +1,34 @@
+"""
+File: evaluator_hybrid.py
+
+Description: Blend of 'evaluator_ab' and 'evaluator_nn' (1:9).
+
+NOTE: Skipping the network when a cheap estimate from 'evaluator_ab' shows the
+score is outside the alpha-beta window doesn't pay: 'evaluator_ab' predicts
+the network poorly (99th percentile errors of 40-260 centidiscs), so with a
+safe margin the network is skipped for about 2% of leaves, and even margins
+which are wrong for half the positions (skipping about a third of the leaves)
+don't make a depth 3 search any faster.
+"""
+
 import evaluator_ab
 import evaluator_nn
 
 
+def blend(cheap, expensive):
+    return float(cheap + 9 * expensive) / 10
+
+
 def evaluate(board):
-    e1 = evaluator_ab.evaluate(board)
-    e2 = evaluator_nn.evaluate(board)
-    return float(e1 + 9 * e2) / 10
+    return blend(evaluator_ab.evaluate(board), evaluator_nn.evaluate(board))
+
+
+def evaluate_batch(boards):
+    """
+    Same as 'evaluate', with one network call for the batch.
+    :param boards: list <- reversi.Board() instances
+    :return: list <- the scores
+    """
+
+    cheap = map(evaluator_ab.evaluate, boards)
+    return map(blend, cheap, evaluator_nn.evaluate_batch(boards))
@@ -1,43 +1,154 @@
 """
 File: evaluator_nn.py
 
-Description: This evaluation module uses a pre-trained neural network.
+Description: This evaluation module uses a pre-trained neural network. With
+'ACCUMULATE', the first hidden layer (before the bias and activation) is kept
+on the board by an 'Accumulator' tracker and updated by adding and
+subtracting weight rows on every move, so only the upper layers are computed
+per evaluation.
+
+With 'PHASE_NETWORKS', a set of (smaller) networks each specialised in a range
+of empties replaces the single network: every evaluation picks its network
+from a table indexed by the number of empties, and the accumulator keeps the
+first layers of all of them side by side.
 """
 
-import cPickle
+import math
 
 import numpy
 import random
 
-INSTANCE_FILE = "network.pkl"
-LOOK_NICE = False
+import bitboard
+import encoding
+import model_loader
+
+INSTANCE_FILE = "network.weights"
+QUANTIZED_FILE = "network_int8.pkl"
+QUANTIZED = False  # Use the int8 copy written by 'quantized_network.py'.
 
-f = open(INSTANCE_FILE, "rb")
-brain = cPickle.load(f)
-f.close()
+# Networks specialised in a stage of the game, as (fewest empties, most
+# empties, weights file), eg. trained with 'EMPTIES_RANGE' in 'train.py'. When
+# given they replace 'INSTANCE_FILE', and their ranges have to cover 0 to 60
+# empties without overlapping. They are float networks ('QUANTIZED' has to be
+# off).
+PHASE_NETWORKS = []
 
 NOISE_FACTOR = 0.00
 LOOK_NICE = True
+# With 'LOOK_NICE', scale the scores by the stage of the game
+# ('draw_function'). Off, the scores are 100 * the logit of the network (and
+# 100 * the disc difference for finished games), see 'self_play.py'.
+STAGE_SCALING = True
+SPARSE = True
+ACCUMULATE = True
 
+brain = None
+networks = None
+network_by_empties = None
+accumulator_rows = None
+accumulator_columns = None
 
-def convert_to_input(board):
-    pieces = board.pieces
-    converted = []
-    for row in pieces:
-        for piece in row:
-            if piece == 0:
-                converted += [1, 0]
-            elif piece == 1:
-                converted += [0, 1]
-            else:
-                converted += [0, 0]
-
-    if board.side == 0:
-        converted += [1, 0]
-    else:
-        converted += [0, 1]
 
-    return converted
+def get_brain():
+    """
+    Gets the network, loading it on first use.
+    :return: neural_network.NeuralNetwork() <- the network
+    """
+
+    global brain
+    if brain is None:
+        if QUANTIZED:
+            brain = model_loader.load_network(QUANTIZED_FILE, "int8 network")
+        else:
+            brain = model_loader.load_network(INSTANCE_FILE)
+    return brain
+
+
+def get_networks():
+    """
+    Gets the networks ('PHASE_NETWORKS', or just the one from 'get_brain') and
+    the table choosing between them, loading them on first use.
+    :return: tuple -> (list of networks, list of the index of the network
+        for every number of empties)
+    """
+
+    global networks, network_by_empties
+    if networks is None:
+        if not PHASE_NETWORKS:
+            networks = [get_brain()]
+            network_by_empties = [0] * 65
+            return networks, network_by_empties
+
+        if QUANTIZED:
+            raise ValueError("'PHASE_NETWORKS' can't be used with "
+                             "'QUANTIZED'")
+
+        table = [None] * 65
+        for index, (lowest, highest, _) in enumerate(PHASE_NETWORKS):
+            for empties in xrange(lowest, highest + 1):
+                if table[empties] is not None:
+                    raise ValueError("'PHASE_NETWORKS' has more than one "
+                                     "network for {} empties".format(empties))
+                table[empties] = index
+        if None in table[:61]:
+            raise ValueError("'PHASE_NETWORKS' doesn't cover {} empties"
+                             .format(table.index(None)))
+
+        networks = [model_loader.load_network(
+            filename, "network for {}-{} empties".format(lowest, highest))
+            for lowest, highest, filename in PHASE_NETWORKS]
+        network_by_empties = table
+
+    return networks, network_by_empties
+
+
+def build_accumulator_rows():
+    """
+    Stacks the rows added to the accumulator on a move: 'placing' rows for
+    square * 2 + side, then 'flipping' rows at 128 + square * 2 + side (the
+    row of the new colour minus the row of the old one), with the columns of
+    every network side by side.
+    :return: tuple -> ((256, total first hidden layer size) rows, list of the
+        slice of the columns of every network)
+    """
+
+    rows = []
+    columns = []
+    start = 0
+    for network in get_networks()[0]:
+        weights = network._inference_state()["weights"][0]
+        placing = weights[:128]
+        flipping = placing - placing[numpy.arange(128) ^ 1]
+        rows.append(numpy.vstack([placing, flipping]))
+        columns.append(slice(start, start + weights.shape[1]))
+        start += weights.shape[1]
+    return numpy.hstack(rows), columns
+
+
+class Accumulator:
+    def __init__(self, board=None):
+        """
+        Tracker holding the sum of the first layer weight rows of the pieces
+        on the board (the side to move is added when evaluating).
+        :param board: reversi.Board() <- board to compute the sum for
+        """
+
+        if board is None:
+            return
+
+        indices = encoding.board_to_indices(board)[:-1]
+        self.values = accumulator_rows[indices].sum(axis=0)
+
+    def copy(self):
+        new_instance = Accumulator()
+        new_instance.values = self.values.copy()
+        return new_instance
+
+    def update(self, coordinate, flipped, side):
+        indices = [16 * coordinate[0] + 2 * coordinate[1] + side]
+        for row, column in flipped:
+            indices.append(128 + 16 * row + 2 * column + side)
+        self.values += accumulator_rows[indices].sum(axis=0)
 
 
 def draw_function(t):
@@ -45,24 +156,19 @@ def draw_function(t):
 
 
 def evaluate(board):
-    if board.is_over():
-        score = board.score()
-        return 100 * (score[0] - score[1])
+    # Bitboards instead of 'board.is_over()', which costs more than the network.
+    black, white = bitboard.from_board(board)
+    if not bitboard.legal_moves(black, white) and \
+            not bitboard.legal_moves(white, black):
+        return 100 * (bitboard.popcount(black) - bitboard.popcount(white))
 
+    empty_places = 64 - bitboard.popcount(black | white)
     if LOOK_NICE:
-        pieces = board.pieces
-        empty_places = 0
-        ascore = 0
-        for row_index in xrange(len(pieces)):
-            for column_index in xrange(len(pieces[row_index])):
-                if pieces[row_index][column_index] == 2:
-                    empty_places += 1
-                elif pieces[row_index][column_index] == 0:
-                    ascore += 1
-                else:
-                    ascore -= 1
-
-        look_nice_factor = draw_function(60 - empty_places)
+        ascore = bitboard.popcount(black) - bitboard.popcount(white)
+
+        look_nice_factor = 1
+        if STAGE_SCALING:
+            look_nice_factor = draw_function(60 - empty_places)
         count_pieces = 8.0
         if empty_places > (64 - count_pieces):
             ascore *= (empty_places - count_pieces) / count_pieces
@@ -72,9 +178,102 @@ def evaluate(board):
         look_nice_factor = 1
         ascore = 0
 
-    inputs = numpy.array([convert_to_input(board)])
-    output = brain.think(inputs)[0][0]
+    loaded, by_empties = get_networks()
+    index = by_empties[empty_places]
+    network = loaded[index]
+
+    # The accumulator rows are float, so the int8 network goes sparse.
+    if ACCUMULATE and not QUANTIZED:
+        global accumulator_rows, accumulator_columns
+        if accumulator_rows is None:
+            accumulator_rows, accumulator_columns = build_accumulator_rows()
+
+        try:
+            accumulator = board.trackers["nn"]
+        except KeyError:
+            accumulator = board.trackers["nn"] = Accumulator(board)
+
+        side_row = network._inference_state()["weights"][0][128 + board.side]
+        inputs = accumulator.values[accumulator_columns[index]] + side_row
+        infer = network.infer_accumulated
+    elif SPARSE:
+        inputs = numpy.array(encoding.board_to_indices(board))
+        infer = network.infer_sparse
+    else:
+        inputs = encoding.board_to_input(board)[None]
+        infer = network.infer
+
     if LOOK_NICE:
-        output = -100 * numpy.log(1 / output - 1 + 10 ** -8)  # Convert to pieces.
+        # Convert to pieces: 1 / sigmoid(x) - 1 is just exp(-x).
+        logit = max(float(infer(inputs, sigmoid=False)[0][0]), -64.)
+        output = -100 * math.log(math.exp(-logit) + 10 ** -8)
+    else:
+        output = float(infer(inputs)[0][0])
     noise = 1 + (NOISE_FACTOR) * (2 * random.random() - 1)
     return noise * look_nice_factor * output  # + ascore
+
+
+def evaluate_batch(boards):
+    """
+    Same as 'evaluate' (without the accumulator) for many boards at once, with
+    one network call per network.
+    :param boards: list <- reversi.Board() instances
+    :return: list <- the scores
+    """
+
+    loaded, by_empties = get_networks()
+    return score_batch(boards, loaded, by_empties, LOOK_NICE, NOISE_FACTOR,
+                       STAGE_SCALING)
+
+
+def score_batch(boards, loaded, by_empties, look_nice, noise_factor,
+                stage_scaling=True):
+    """
+    Scores a batch of boards like 'evaluate' (also used by 'evaluator_test').
+    :param boards: list <- reversi.Board() instances
+    :param loaded: list <- networks
+    :param by_empties: list <- index in 'loaded' for every number of empties
+    :param look_nice: bool <- 'LOOK_NICE' of the calling module
+    :param noise_factor: float <- 'NOISE_FACTOR' of the calling module
+    :param stage_scaling: bool <- 'STAGE_SCALING' of the calling module
+    :return: list <- the scores
+    """
+
+    scores = [None] * len(boards)
+    pending = []
+    factors = []
+    groups = {}  # Network index -> positions in 'pending'.
+    for index, board in enumerate(boards):
+        black, white = bitboard.from_board(board)
+        if not bitboard.legal_moves(black, white) and \
+                not bitboard.legal_moves(white, black):
+            scores[index] = 100 * (bitboard.popcount(black) -
+                                   bitboard.popcount(white))
+            continue
+
+        empty_places = 64 - bitboard.popcount(black | white)
+        groups.setdefault(by_empties[empty_places], []).append(len(pending))
+        pending.append(index)
+        if look_nice and stage_scaling:
+            factors.append(draw_function(60 - empty_places))
+        else:
+            factors.append(1)
+
+    if not pending:
+        return scores
+
+    # One network call per network.
+    outputs = numpy.empty(len(pending))
+    for network_index, positions in groups.iteritems():
+        inputs = encoding.boards_to_input([boards[pending[position]]
+                                           for position in positions])
+        outputs[positions] = loaded[network_index].infer(
+            inputs, sigmoid=not look_nice)[:, 0]
+    if look_nice:
+        logits = numpy.maximum(outputs, -64.)
+        outputs = -100 * numpy.log(numpy.exp(-logits) + 10 ** -8)
+
+    for index, factor, output in zip(pending, factors, outputs):
+        noise = 1 + noise_factor * (2 * random.random() - 1)
+        scores[index] = noise * factor * float(output)
+    return scores
@@ -0,0 +1,190 @@
+"""
+File: evaluator_pattern.py
+
+Description: This evaluation module sums learned weights for edge, corner,
+row and diagonal patterns, with a separate set of weights for every stage of
+the game. Every pattern instance is looked up by its index (the squares read
+as a base 3 number: 0 for empty, 1 for black and 2 for white), which is kept
+up to date on every move by a tracker on the board rather than recomputed.
+
+The weights are fitted by 'fit_patterns.py'.
+"""
+
+import operator
+import os
+import sys
+import time
+
+import numpy
+
+import bitboard
+import model_loader
+
+PATTERN_FILE = "patterns.npz"
+
+EMPTY = 2
+BLACK = 0
+WHITE = 1
+
+STAGES = 6
+ENDGAME_CHECK = 12  # Look for a finished game from this many empties down.
+
+# Base square lists of every pattern family; the instances are all the
+# distinct images of these under the eight symmetries of the board.
+PATTERNS = [
+    ("edge_x", [(0, 0), (0, 1), (0, 2), (0, 3), (0, 4), (0, 5), (0, 6), (0, 7),
+                (1, 1), (1, 6)]),
+    ("corner_3x3", [(0, 0), (0, 1), (0, 2), (1, 0), (1, 1), (1, 2),
+                    (2, 0), (2, 1), (2, 2)]),
+    ("corner_2x5", [(0, 0), (0, 1), (0, 2), (0, 3), (0, 4),
+                    (1, 0), (1, 1), (1, 2), (1, 3), (1, 4)]),
+    ("row_2", [(1, n) for n in xrange(8)]),
+    ("row_3", [(2, n) for n in xrange(8)]),
+    ("row_4", [(3, n) for n in xrange(8)]),
+    ("diagonal_8", [(n, n) for n in xrange(8)]),
+    ("diagonal_7", [(n, n + 1) for n in xrange(7)]),
+    ("diagonal_6", [(n, n + 2) for n in xrange(6)]),
+    ("diagonal_5", [(n, n + 3) for n in xrange(5)]),
+    ("diagonal_4", [(n, n + 4) for n in xrange(4)]),
+]
+
+SYMMETRIES = [
+    lambda r, c: (r, c),
+    lambda r, c: (c, r),
+    lambda r, c: (r, 7 - c),
+    lambda r, c: (7 - r, c),
+    lambda r, c: (7 - r, 7 - c),
+    lambda r, c: (c, 7 - r),
+    lambda r, c: (7 - c, r),
+    lambda r, c: (7 - c, 7 - r),
+]
+
+
+def _instances():
+    instances = []
+    for family, (name, squares) in enumerate(PATTERNS):
+        seen = set()
+        for symmetry in SYMMETRIES:
+            transformed = [symmetry(r, c) for r, c in squares]
+            if frozenset(transformed) not in seen:
+                seen.add(frozenset(transformed))
+                instances.append((family, transformed))
+    return instances
+
+
+# (family, squares) of every pattern instance.
+INSTANCES = _instances()
+FAMILY_SIZES = [3 ** len(squares) for _, squares in PATTERNS]
+
+# For every square: (instance, power of 3) of everything it's part of.
+SQUARE_INSTANCES = {(r, c): [] for r in xrange(8) for c in xrange(8)}
+for _instance, (_, _squares) in enumerate(INSTANCES):
+    for _power, _square in enumerate(_squares):
+        SQUARE_INSTANCES[_square].append((_instance, 3 ** _power))
+
+STAGE_OF_EMPTIES = [(60 - min(empties, 60)) * STAGES // 61
+                    for empties in xrange(65)]
+
+weights = None
+biases = None
+
+
+class PatternIndices:
+    def __init__(self, board=None):
+        """
+        Tracker holding the index of every pattern instance (and the number of
+        discs of each side) for a board. Add it to 'board.trackers' so it's
+        updated on every move and copied along with the board.
+        :param board: reversi.Board() <- board to compute the indices for
+        """
+
+        if board is None:
+            return
+
+        self.indices = [0] * len(INSTANCES)
+        self.discs = [0, 0]
+        for r, row in enumerate(board.pieces):
+            for c, piece in enumerate(row):
+                if piece == EMPTY:
+                    continue
+                self.discs[piece] += 1
+                for instance, power in SQUARE_INSTANCES[(r, c)]:
+                    self.indices[instance] += (piece + 1) * power
+
+    def copy(self):
+        new_instance = PatternIndices()
+        new_instance.indices = list(self.indices)
+        new_instance.discs = list(self.discs)
+        return new_instance
+
+    def update(self, coordinate, flipped, side):
+        indices = self.indices
+        for instance, power in SQUARE_INSTANCES[coordinate]:
+            indices[instance] += (side + 1) * power
+
+        # A flip turns a 2 into a 1 (black) or a 1 into a 2 (white).
+        sign = 1 if side == WHITE else -1
+        for square in flipped:
+            for instance, power in SQUARE_INSTANCES[square]:
+                indices[instance] += sign * power
+
+        self.discs[side] += len(flipped) + 1
+        self.discs[not side] -= len(flipped)
+
+
+def load_weights(filename=PATTERN_FILE):
+    """
+    Loads the pattern weights into 'weights' and 'biases'. Missing weights
+    (no file yet) evaluate everything as 0.
+    :param filename: str <- file written by 'fit_patterns.py'
+    :return: None
+    """
+
+    global weights, biases
+
+    start_time = time.time()
+    if os.path.exists(filename):
+        data = numpy.load(filename)
+        tables = [data[name] for name, _ in PATTERNS]
+        stage_biases = data["bias"]
+    else:
+        sys.stderr.write("'{}' not found, pattern weights are all zero; run "
+                         "'fit_patterns.py' first.\n".format(filename))
+        tables = [numpy.zeros((STAGES, size)) for size in FAMILY_SIZES]
+        stage_biases = numpy.zeros((STAGES, 2))
+
+    # Plain lists per instance: indexing them beats indexing numpy arrays.
+    weights = []
+    for stage in xrange(STAGES):
+        family_tables = [table[stage].tolist() for table in tables]
+        weights.append([family_tables[family] for family, _ in INSTANCES])
+    biases = stage_biases.tolist()
+
+    model_loader.record("pattern weights", filename, time.time() - start_time)
+
+
+def game_over(board):
+    black, white = bitboard.from_board(board)
+    return not bitboard.legal_moves(black, white) and \
+        not bitboard.legal_moves(white, black)
+
+
+def evaluate(board):
+    if weights is None:
+        load_weights()
+
+    try:
+        tracker = board.trackers["pattern"]
+    except KeyError:
+        tracker = board.trackers["pattern"] = PatternIndices(board)
+
+    black, white = tracker.discs
+    empties = 64 - black - white
+    if empties == 0 or black == 0 or white == 0 or \
+            (empties <= ENDGAME_CHECK and game_over(board)):
+        return 100 * (black - white)
+
+    stage = STAGE_OF_EMPTIES[empties]
+    score = biases[stage][board.side]
+    score += sum(map(operator.getitem, weights[stage], tracker.indices))
+    return score
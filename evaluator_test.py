@@ -4,41 +4,28 @@ File: evaluator_test.py
 Description: This is a copy of the 'evaluator_nn.py' file.
 """
 
-import cPickle
+import math
 
 import numpy
 import random
 
-INSTANCE_FILE = "network_test.pkl"
-LOOK_NICE = False
+import encoding
+import evaluator_nn
+import model_loader
 
-f = open(INSTANCE_FILE, "rb")
-brain = cPickle.load(f)
-f.close()
+INSTANCE_FILE = "network_test.weights"
 
 NOISE_FACTOR = 0.01
 LOOK_NICE = True
 
+brain = None
 
-def convert_to_input(board):
-    pieces = board.pieces
-    converted = []
 
-    for row in pieces:
-        for piece in row:
-            if piece == 0:
-                converted += [1, 0]
-            elif piece == 1:
-                converted += [0, 1]
-            else:
-                converted += [0, 0]
-
-    if board.side == 0:
-        converted += [1, 0]
-    else:
-        converted += [0, 1]
-
-    return converted
+def get_brain():
+    global brain
+    if brain is None:
+        brain = model_loader.load_network(INSTANCE_FILE, "test network")
+    return brain
 
 
 def draw_function(t):
@@ -61,9 +48,25 @@ def evaluate(board):
     else:
         look_nice_factor = 1
 
-    inputs = numpy.array([convert_to_input(board)])
-    output = brain.think(inputs)[0][0]
+    network = get_brain()
+    inputs = encoding.board_to_input(board)[None]
     if LOOK_NICE:
-        output = -100 * numpy.log(1 / output - 1 + 10 ** -8)  # Convert to pieces.
+        # Convert to pieces: 1 / sigmoid(x) - 1 is just exp(-x).
+        logit = max(float(network.infer(inputs, sigmoid=False)[0][0]), -64.)
+        output = -100 * math.log(math.exp(-logit) + 10 ** -8)
+    else:
+        output = float(network.infer(inputs)[0][0])
     noise = 1 + (NOISE_FACTOR) * (2 * random.random() - 1)
     return noise * look_nice_factor * output
+
+
+def evaluate_batch(boards):
+    """
+    Same as 'evaluate' for many boards at once, with a single network call
+    (shared with 'evaluator_nn').
+    :param boards: list <- reversi.Board() instances
+    :return: list <- the scores
+    """
+
+    return evaluator_nn.score_batch(boards, [get_brain()], [0] * 65,
+                                    LOOK_NICE, NOISE_FACTOR)
@@ -0,0 +1,222 @@
+#! /usr/bin/python
+
+"""
+file: fit_patterns.py
+
+Description: Fits the weights of 'evaluator_pattern.py' on the Edax labelled
+training data. Pattern indices are extracted for every position at once with
+numpy, folded over the symmetries of each pattern, and the weights of every
+stage are solved as a ridge regularized sparse least squares problem with
+conjugate gradients (the design matrix is never built).
+
+Usage: python fit_patterns.py [data file] [label scale]
+
+The label scale undoes the sigmoid the data was collected with: 1 for
+'training_data.txt' ('collect_data.py') and 2 for 'training_data_catered.txt'
+('collect_data_catered.py').
+"""
+
+import sys
+import time
+
+import numpy
+
+import datafile_manager
+import evaluator_pattern
+
+DATA_FILE = "training_data_catered.txt"
+LABEL_SCALE = 2.0
+SAVE_FILE = evaluator_pattern.PATTERN_FILE
+
+RIDGE = 5.0
+ITERATIONS = 300
+TOLERANCE = 10 ** -6
+HOLDOUT = 0.1
+SEED = 0
+
+DIGITS = numpy.zeros(256, dtype=numpy.int64)
+DIGITS[ord("X")] = 1
+DIGITS[ord("O")] = 2
+
+
+def printf(s):
+    sys.stdout.write(s)
+    sys.stdout.flush()
+
+
+def load_positions(filename, label_scale):
+    """
+    Loads a data file as arrays.
+    :param filename: str <- "position:label" data file
+    :param label_scale: float <- multiplier on the logit of the labels
+    :return: tuple -> (digits (N, 64), sides (N,), targets (N,) in centidiscs)
+    """
+
+    data = datafile_manager.load_data(filename)
+    positions = numpy.frombuffer("".join(data.keys()), dtype=numpy.uint8)
+    positions = positions.reshape(-1, 65)
+
+    digits = DIGITS[positions[:, :64]]
+    sides = (positions[:, 64] != ord("X")).astype(numpy.int64)
+
+    labels = numpy.array(data.values(), dtype=numpy.float64)
+    labels = numpy.clip(labels, 10 ** -6, 1 - 10 ** -6)
+    targets = 100 * label_scale * numpy.log(labels / (1 - labels))
+
+    return digits, sides, targets
+
+
+def canonical_indices(squares):
+    """
+    Maps every index of a pattern to the smallest index it has under the
+    symmetries which map the pattern onto itself (eg. an edge read backwards).
+    :param squares: list <- (row, column) of the squares of the pattern
+    :return: numpy.array <- canonical index of every index
+    """
+
+    size = len(squares)
+    powers = 3 ** numpy.arange(size)
+    indices = numpy.arange(3 ** size)
+    digits = indices[:, None] // powers % 3
+
+    canonical = indices.copy()
+    for symmetry in evaluator_pattern.SYMMETRIES:
+        transformed = [symmetry(r, c) for r, c in squares]
+        if set(transformed) != set(squares):
+            continue
+        permutation = [squares.index(square) for square in transformed]
+        canonical = numpy.minimum(canonical, digits.dot(powers[permutation]))
+
+    return canonical
+
+
+def extract_features(digits, sides, canonicals, offsets):
+    """
+    Builds the column of every non-zero feature of every position: one per
+    pattern instance plus a bias column for the side to move.
+    :return: numpy.array <- (N, instances + 1) column numbers
+    """
+
+    columns = []
+    for family, squares in evaluator_pattern.INSTANCES:
+        flat = [r * 8 + c for r, c in squares]
+        index = digits[:, flat].dot(3 ** numpy.arange(len(flat)))
+        columns.append(offsets[family] + canonicals[family][index])
+    columns.append(offsets[-1] + sides)
+    return numpy.column_stack(columns)
+
+
+def solve(columns, targets, size, ridge=RIDGE, iterations=ITERATIONS):
+    """
+    Solves (A'A + ridge * I) w = A'y by conjugate gradients, where row i of
+    A is one at 'columns[i]' and zero elsewhere.
+    :return: numpy.array <- the weights
+    """
+
+    width = columns.shape[1]
+    flat = columns.ravel()
+
+    def normal(w):
+        predictions = w[columns].sum(axis=1)
+        return numpy.bincount(flat, weights=numpy.repeat(predictions, width),
+                              minlength=size) + ridge * w
+
+    w = numpy.zeros(size)
+    residual = numpy.bincount(flat, weights=numpy.repeat(targets, width),
+                              minlength=size)
+    direction = residual.copy()
+    error = residual.dot(residual)
+    first_error = error
+
+    for _ in xrange(iterations):
+        if error <= TOLERANCE * first_error:
+            break
+        product = normal(direction)
+        step = error / direction.dot(product)
+        w += step * direction
+        residual -= step * product
+        new_error = residual.dot(residual)
+        direction = residual + (new_error / error) * direction
+        error = new_error
+
+    return w
+
+
+def fit(digits, sides, targets):
+    """
+    Fits every stage and returns the tables in the format of
+    'evaluator_pattern.load_weights'.
+    :return: dict <- family name -> (stages, 3 ** size) weights, plus "bias"
+    """
+
+    canonicals = [canonical_indices(squares)
+                  for _, squares in evaluator_pattern.PATTERNS]
+    offsets = numpy.cumsum([0] + evaluator_pattern.FAMILY_SIZES)
+    size = offsets[-1] + 2
+
+    printf("Extracting features... ")
+    columns = extract_features(digits, sides, canonicals, offsets)
+    printf("Done\n")
+
+    empties = (digits == 0).sum(axis=1)
+    stages = numpy.array(evaluator_pattern.STAGE_OF_EMPTIES)[empties]
+
+    random = numpy.random.RandomState(SEED)
+    holdout = random.random_sample(len(targets)) < HOLDOUT
+
+    tables = {name: numpy.zeros((evaluator_pattern.STAGES, 3 ** len(squares)),
+                                dtype=numpy.float32)
+              for name, squares in evaluator_pattern.PATTERNS}
+    tables["bias"] = numpy.zeros((evaluator_pattern.STAGES, 2),
+                                 dtype=numpy.float32)
+
+    for stage in xrange(evaluator_pattern.STAGES):
+        train = (stages == stage) & ~holdout
+        test = (stages == stage) & holdout
+        if not train.any():
+            continue
+
+        w = solve(columns[train], targets[train], size)
+
+        train_error = numpy.sqrt(numpy.mean(
+            (w[columns[train]].sum(axis=1) - targets[train]) ** 2)) / 100
+        test_error = float("nan")
+        if test.any():
+            test_error = numpy.sqrt(numpy.mean(
+                (w[columns[test]].sum(axis=1) - targets[test]) ** 2)) / 100
+        printf("Stage {} :: {} positions :: RMSE train {} / holdout {} "
+               "discs\n".format(stage, train.sum(), round(train_error, 2),
+                                round(test_error, 2)))
+
+        for family, (name, _) in enumerate(evaluator_pattern.PATTERNS):
+            table = w[offsets[family]: offsets[family + 1]]
+            tables[name][stage] = table[canonicals[family]]
+        tables["bias"][stage] = w[offsets[-1]:]
+
+    return tables
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        DATA_FILE = sys.argv[1]
+    if len(sys.argv) > 2:
+        LABEL_SCALE = float(sys.argv[2])
+
+    start_time = time.time()
+
+    try:
+        printf("Loading data file... ")
+        position_digits, position_sides, position_targets = load_positions(
+            DATA_FILE, LABEL_SCALE)
+        printf("Done ({} positions)\n".format(len(position_targets)))
+    except IOError:
+        printf("Data file not found, quitting... \n")
+        exit(0)
+
+    weights = fit(position_digits, position_sides, position_targets)
+
+    printf("Saving weights... ")
+    numpy.savez_compressed(SAVE_FILE, **weights)
+    printf("Done\n")
+
+    printf("Finished in {} seconds\n".format(round(time.time() - start_time, 1)))
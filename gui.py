@@ -11,20 +11,36 @@ Dependencies:
 """
 
 import sys
+import time
+
+IMPORT_START = time.time()
 
 import Tkinter
 import random
 import tkMessageBox
 
 import searcher
+import search_thread
+import evaluation_cache
 import evaluator_ab
+import evaluator_hybrid
 import evaluator_nn
+import evaluator_pattern
 import evaluator_test
+import model_loader
+
+sys.stderr.write("Imported modules in {} ms\n{}\n".format(
+    round(1000 * (time.time() - IMPORT_START), 1), model_loader.report()))
 
+# The pattern evaluator is cheaper than a cache lookup, and the networks
+# aren't symmetric (so their mirror images aren't folded together).
 evaluators = {
-    "ab": evaluator_ab.evaluate,
-    "nn": evaluator_nn.evaluate,
-    "test": evaluator_test.evaluate,
+    "ab": evaluation_cache.cached(evaluator_ab.evaluate),
+    "nn": evaluation_cache.cached(evaluator_nn.evaluate, symmetric=False),
+    "test": evaluation_cache.cached(evaluator_test.evaluate, symmetric=False),
+    "pattern": evaluator_pattern.evaluate,
+    "hybrid": evaluation_cache.cached(evaluator_hybrid.evaluate,
+                                      symmetric=False),
 }
 
 levels = {
@@ -42,7 +58,8 @@ try:
 
     LEVEL = 1
     PLAYER = "black"
-    EVALUATOR = evaluator_nn.evaluate
+    EVALUATOR = evaluators["nn"]
+    MAX_MEMORY = None
     for argument in sys.argv[1:]:
         attribute, value = map(lambda x: x.lower(), argument.split("="))
         if attribute == "player":
@@ -67,6 +84,8 @@ try:
                 message = "'{}' not a valid argument for 'computer'; using " \
                           "default: 'nn'".format(value)
                 tkMessageBox.showwarning(title="Warning", message=message)
+        elif attribute == "memory":
+            MAX_MEMORY = float(value)
         elif attribute == "searcher" and value[:-1] == "test":
             import searcher_test as searcher
             import searcher as old_searcher
@@ -75,7 +94,8 @@ try:
 except:
     PLAYER = "black"
     LEVEL = 1
-    EVALUATOR = evaluator_nn.evaluate
+    EVALUATOR = evaluators["nn"]
+    MAX_MEMORY = None
     message = "There's something wrong with your command; continuing with " \
               "default values."
     tkMessageBox.showerror(title="Error", message=message)
@@ -88,6 +108,14 @@ turn = 0
 COLORS = ("black", "white", "green4", "chartreuse3")
 HIGHLIGHT_COLORS = ("gray8", "gray96", "green4", "chartreuse2")
 COMPUTER_MOVING = False
+POLL_INTERVAL = 50
+PONDER = True
+# Pondering has no time limit, so without 'memory=' the tree is kept to this
+# many megabytes (by 'Searcher.evict').
+PONDER_MEMORY = 256
+
+search = None
+ponder = None
 
 
 def get_insult(score):
@@ -108,6 +136,14 @@ def get_insult(score):
     return random.choice(insults) + "\nScore: {}".format(score)
 
 
+def stop_pondering():
+    global ponder
+
+    if ponder is not None:
+        ponder.cancel()
+        ponder = None
+
+
 def callback(coordinate):
     global COMPUTER_MOVING, root, bot, turn
 
@@ -120,6 +156,7 @@ def callback(coordinate):
         turn += 1
         COMPUTER_MOVING = True
 
+        stop_pondering()
         bot.move(move)
         update(bot.board.pieces)
 
@@ -131,6 +168,7 @@ def callback(coordinate):
         turn += 1
         COMPUTER_MOVING = True
 
+        stop_pondering()
         bot.move(move)
         update(bot.board.pieces)
 
@@ -139,15 +177,25 @@ def callback(coordinate):
 
 
 def computer_move():
-    global COMPUTER_MOVING, status_label, root, bot, turn
+    global search, turn
     turn += 1
 
-    bot.timed_expand(TIME[turn])
-    while bot.fully_expanded - int(not bot.caught_up) < MINIMUM_DEPTH:
-        bot.expand()
+    search = search_thread.start_search(bot, TIME[turn], MINIMUM_DEPTH)
+    root.after(POLL_INTERVAL, finish_computer_move)
 
-    bot.update_scores()
-    bot.move(bot.best_move())
+
+def finish_computer_move():
+    global COMPUTER_MOVING, status_label, root, bot, search, ponder
+
+    if not search.done():
+        progress = search.latest()
+        if progress is not None:
+            status_label.config(
+                text="Thinking... {} ply".format(progress["depth"]))
+        root.after(POLL_INTERVAL, finish_computer_move)
+        return
+
+    bot.move(search.best_move())
 
     update(bot.board.pieces)
 
@@ -173,6 +221,9 @@ def computer_move():
         status_label.config(text="Your turn.")
         COMPUTER_MOVING = False
 
+        if PONDER:
+            ponder = search_thread.start_ponder(bot)
+
 
 def update(pieces):
     global function_list, bot
@@ -190,7 +241,7 @@ def update(pieces):
         evaluation_label.config(text="TESTING      TESTING")
     else:
         information = "{} ply :: {} nodes".format(bot.fully_expanded,
-                                                  bot.number_nodes())
+                                                  bot.node_count)
         information_label.config(text=information)
  
         evaluation = "Evaluation: {}".format(round(bot.game_tree.score / 100, 2))
@@ -205,7 +256,14 @@ if __name__ == "__main__":
 
     sys.stdout = open(os.devnull, "w")
 
-    bot = searcher.Searcher((EVALUATOR, EVALUATOR))
+    if MAX_MEMORY is None and PONDER:
+        MAX_MEMORY = PONDER_MEMORY
+
+    max_nodes = None
+    if MAX_MEMORY is not None:
+        max_nodes = searcher.nodes_for_memory(MAX_MEMORY)
+
+    bot = searcher.Searcher((EVALUATOR, EVALUATOR), max_nodes=max_nodes)
     bot.update_scores()
 
     WINDOW_SIZE = 4
@@ -0,0 +1,73 @@
+"""
+File: model_loader.py
+
+Description: Loads the models used by the evaluators (on first use, so a
+process only pays for the evaluator it actually plays with) and keeps a record
+of what was loaded and how long it took, for 'report'.
+"""
+
+import cPickle
+import os
+import sys
+import time
+
+import neural_network
+
+VERBOSE = True
+
+loaded = []
+
+
+def record(description, filename, seconds):
+    """
+    Adds a load to the report.
+    :param description: str <- what was loaded
+    :param filename: str <- file it was loaded from
+    :param seconds: float <- how long it took
+    :return: None
+    """
+
+    size = os.path.getsize(filename) if os.path.exists(filename) else 0
+    loaded.append((description, filename, size, seconds))
+    if VERBOSE:
+        sys.stderr.write("Loaded {} from '{}' ({} KB) in {} ms\n".format(
+            description, filename, size // 1024, round(1000 * seconds, 1)))
+
+
+def load_network(filename, description="network"):
+    """
+    Loads a network: weights files are memory-mapped, anything else is
+    expected to be a pickle (eg. from 'train.py' or 'quantized_network.py').
+    :param filename: str <- file to load
+    :param description: str <- what is being loaded (for the report)
+    :return: the network
+    """
+
+    start_time = time.time()
+
+    if filename.endswith(".weights"):
+        network = neural_network.load(filename)
+    else:
+        f = open(filename, "rb")
+        network = cPickle.load(f)
+        f.close()
+
+    record(description, filename, time.time() - start_time)
+    return network
+
+
+def report():
+    """
+    Describes everything loaded so far.
+    :return: str <- one line per load
+    """
+
+    if not loaded:
+        return "No models loaded"
+
+    lines = ["{}: '{}' ({} KB) in {} ms".format(
+        description, filename, size // 1024, round(1000 * seconds, 1))
+        for description, filename, size, seconds in loaded]
+    total = sum(seconds for _, _, _, seconds in loaded)
+    lines.append("Total: {} ms".format(round(1000 * total, 1)))
+    return "\n".join(lines)
@@ -4,6 +4,8 @@
 # Imports here...
 import numpy
 
+import weightsfile_manager
+
 
 def compress(a, n):
     new_array = []
@@ -14,14 +16,41 @@ def compress(a, n):
     return new_array
 
 
+def load(filename, mmap=True):
+    """
+    Creates a network from a weights file (see 'weightsfile_manager.py'). When
+    mapped, the network only reads the file's pages (shared with every other
+    process mapping it) and can't be trained.
+    :param filename: str <- weights file to load
+    :param mmap: bool <- map the weights (read-only) instead of reading them
+    :return: NeuralNetwork() <- the network
+    """
+
+    arrays, header = weightsfile_manager.load_arrays(filename, mmap)
+    weights_list = []
+    while weightsfile_manager.layer_name(len(weights_list)) in arrays:
+        weights_list.append(arrays[weightsfile_manager.layer_name(len(weights_list))])
+
+    network = NeuralNetwork(weights_list=weights_list)
+    network.padded_first_weights = arrays.get("padded_first_weights")
+    network.iteration = header["metadata"].get("iteration", 0)
+    network.error = header["metadata"].get("error")
+    return network
+
+
 # Classes here...
 class NeuralNetwork:
-    def __init__(self, input_layer_size=2, hidden_layer_sizes=(4,), output_layer_size=1):
+    def __init__(self, input_layer_size=2, hidden_layer_sizes=(4,), output_layer_size=1,
+                 weights_list=None):
         # Process class arguments.
         self.hidden_layer_sizes = hidden_layer_sizes
 
         # Create the weights.
-        if len(hidden_layer_sizes) == 0:
+        if weights_list is not None:
+            # Given (eg. from a weights file): the sizes follow from the shapes.
+            self.hidden_layer_sizes = tuple(w.shape[1] for w in weights_list[:-1])
+            self.weights_list = list(weights_list)
+        elif len(hidden_layer_sizes) == 0:
             self.weights_list = [self.initialize_weights(input_layer_size + 1, output_layer_size)]
         else:
             self.weights_list = [self.initialize_weights(input_layer_size + 1, self.hidden_layer_sizes[0])]
@@ -32,8 +61,39 @@ class NeuralNetwork:
             self.weights_list.append(self.initialize_weights(self.hidden_layer_sizes[-1], output_layer_size))
 
         self.iteration = 0
-        self.velocities = [numpy.zeros_like(weights) for weights in self.weights_list]
+        # numpy.zeros (unlike zeros_like) leaves the pages untouched until training.
+        self.velocities = [numpy.zeros(weights.shape, weights.dtype) for weights in self.weights_list]
         self.error = None
+        self.padded_first_weights = None
+        self._inference = None
+        self._training = None
+
+    def __getstate__(self):
+        # The inference copies and the buffers are rebuilt on demand.
+        state = self.__dict__.copy()
+        state.pop("_inference", None)
+        state.pop("_training", None)
+        state.pop("padded_first_weights", None)
+        return state
+
+    def save(self, filename):
+        """
+        Saves the network to a weights file, with the first layer also in the
+        padded layout of 'infer_sparse' so that 'load' doesn't need to copy it.
+        :param filename: str <- file to write
+        :return: None
+        """
+
+        first_weights = self.weights_list[0]
+        padded_first_weights = numpy.zeros_like(first_weights)
+        padded_first_weights[:-1] = first_weights[:-1]
+        metadata = {
+            "hidden_layer_sizes": list(self.hidden_layer_sizes),
+            "iteration": self.iteration,
+            "error": self.error,
+        }
+        weightsfile_manager.save_weights(self.weights_list, filename, metadata,
+                                         {"padded_first_weights": padded_first_weights})
 
     @staticmethod
     def initialize_weights(rows, columns):
@@ -97,8 +157,167 @@ class NeuralNetwork:
             gradient = layers[layer_index].T.dot(layers_deltas[layer_index])
             self.weights_list[layer_index] += alpha * gradient
 
+    def _training_state(self):
+        """
+        Float32 weights and velocities, and the buffers of 'compute_gradients'
+        and 'apply_gradients', allocated once.
+        :return: dict <- "gradients", "steps" and per batch size "batches"
+        """
+
+        if getattr(self, "_training", None) is None:
+            # Writable float32 copies (weights from a file are read-only).
+            self.weights_list = [numpy.require(w, numpy.float32, ["C", "W"]) for w in self.weights_list]
+            self.velocities = [numpy.require(v, numpy.float32, ["C", "W"]) for v in self.velocities]
+            self._training = {
+                "gradients": [numpy.empty_like(w) for w in self.weights_list],
+                "steps": [numpy.empty_like(w) for w in self.weights_list],
+                "batches": {},
+            }
+
+        return self._training
+
+    def _batch_buffers(self, state, batch_size):
+        try:
+            return state["batches"][batch_size]
+        except KeyError:
+            # The bias is a column of ones after the inputs.
+            inputs = numpy.empty((batch_size, len(self.weights_list[0])), dtype=numpy.float32)
+            inputs[:, -1] = 1.
+            outputs = [numpy.empty((batch_size, w.shape[1]), dtype=numpy.float32)
+                       for w in self.weights_list]
+            buffers = {
+                "layers": [inputs] + outputs,
+                "masks": [numpy.empty(layer.shape, dtype=numpy.bool_) for layer in outputs[:-1]],
+                "deltas": [numpy.empty_like(layer) for layer in outputs],
+            }
+            state["batches"][batch_size] = buffers
+            return buffers
+
+    @staticmethod
+    def _dropout(layer, mask, dropout_percentage):
+        # One random byte per unit instead of a float64 binomial draw.
+        random_bytes = numpy.frombuffer(numpy.random.bytes(layer.size), dtype=numpy.uint8)
+        numpy.greater_equal(random_bytes.reshape(layer.shape), int(round(256 * dropout_percentage)),
+                            out=mask)
+        layer *= mask
+        layer *= 1.0 / (1 - dropout_percentage)
+
+    def compute_gradients(self, training_inputs, training_outputs, dropout_percentage=0.2):
+        """
+        Forward and backward pass of one batch (the gradient part of 'train').
+        NOTE: The gradients are buffers reused by the next call, use (or copy)
+        them before computing more.
+        :param training_inputs: numpy.array <- (batch size, inputs) inputs
+        :param training_outputs: numpy.array <- (batch size, outputs) targets
+        :param dropout_percentage: float <- fraction of hidden units to drop
+        :return: tuple -> (list of gradients per weights matrix, accuracy (%))
+        """
+
+        state = self._training_state()
+        buffers = self._batch_buffers(state, len(training_inputs))
+        weights_list = self.weights_list
+        layers = buffers["layers"]
+        deltas = buffers["deltas"]
+
+        # Forward propagate through the layers.
+        layers[0][:, :-1] = training_inputs
+        for index in xrange(len(weights_list) - 1):
+            layer = numpy.dot(layers[index], weights_list[index], out=layers[index + 1])
+            numpy.clip(layer, 0., 64., out=layer)
+            if dropout_percentage:
+                self._dropout(layer, buffers["masks"][index], dropout_percentage)
+
+        output = numpy.dot(layers[-2], weights_list[-1], out=layers[-1])
+        numpy.clip(output, -64., 64., out=output)
+        numpy.negative(output, out=output)
+        numpy.exp(output, out=output)
+        output += 1.
+        numpy.reciprocal(output, out=output)
+
+        # Backward propagate, with the same (odd) factors as 'train_legacy':
+        # the output error is squared around -1, and the errors are scaled by
+        # the activations (the sigmoid of the output, the hidden layers as
+        # they are) where the derivatives would usually be.
+        delta = deltas[-1]
+        numpy.subtract(training_outputs, output, out=delta)
+        delta += 1.
+        numpy.square(delta, out=delta)
+        delta -= 1.
+        accuracy = 100 * (1 - numpy.sum(numpy.abs(delta)) / len(training_outputs))
+
+        numpy.negative(output, out=output)
+        numpy.exp(output, out=output)
+        output += 1.
+        delta /= output
+
+        for index in reversed(xrange(len(weights_list) - 1)):
+            numpy.dot(deltas[index + 1], weights_list[index + 1].T, out=deltas[index])
+            deltas[index] *= layers[index + 1]
+
+        gradients = state["gradients"]
+        for index in xrange(len(weights_list)):
+            numpy.dot(layers[index].T, deltas[index], out=gradients[index])
+
+        return gradients, accuracy
+
+    def apply_gradients(self, gradients, alpha, beta=0.9):
+        """
+        Momentum update (the update part of 'train'), in place.
+        :param gradients: list <- gradients per weights matrix
+        :param alpha: float <- learning rate
+        :param beta: float <- momentum
+        :return: None
+        """
+
+        steps = self._training_state()["steps"]
+        for weights, velocity, gradient, step in zip(self.weights_list, self.velocities, gradients, steps):
+            velocity *= beta
+            velocity += gradient
+            numpy.multiply(velocity, alpha, out=step)
+            weights += step
+
     def train(self, training_inputs, training_outputs, iterations=1000, alpha=1.0, beta=0.9,
               dropout_percentage=0.2):
+        """
+        Trains on a batch, in float32 with buffers kept between calls.
+        :param training_inputs: numpy.array <- (batch size, inputs) inputs
+        :param training_outputs: numpy.array <- (batch size, outputs) targets
+        :param iterations: int <- number of steps on the batch
+        :param alpha: float <- learning rate
+        :param beta: float <- momentum
+        :param dropout_percentage: float <- fraction of hidden units to drop
+        :return: float <- average accuracy (%) over the steps
+        """
+
+        total_error = 0
+        for iteration in xrange(iterations):
+            gradients, accuracy = self.compute_gradients(training_inputs, training_outputs,
+                                                         dropout_percentage)
+            self.apply_gradients(gradients, alpha, beta)
+            self.iteration += 1
+            total_error += accuracy
+
+        return self._finish_training(total_error / iterations)
+
+    def _finish_training(self, average_error):
+        self._inference = None
+        self.padded_first_weights = None
+
+        if self.error is None:
+            self.error = 0
+        else:
+            # self.error = 0.999 * self.error + 0.001 * average_error
+            self.error = 0.99 * self.error + 0.01 * average_error
+
+        return average_error
+
+    def train_legacy(self, training_inputs, training_outputs, iterations=1000, alpha=1.0, beta=0.9,
+                     dropout_percentage=0.2):
+        """
+        The original float64 training step (allocating everything on every
+        step), kept for comparison with 'train' (see 'benchmark_training.py').
+        """
+
         # Add a bias...
         training_inputs = numpy.c_[training_inputs, numpy.ones(len(training_inputs))]
         total_error = 0
@@ -143,14 +362,7 @@ class NeuralNetwork:
 
             total_error += 100 * (1 - numpy.sum(numpy.abs(output_layer_error)) / len(training_outputs))
 
-        average_error = total_error / iterations
-        if self.error is None:
-            self.error = 0
-        else:
-            # self.error = 0.999 * self.error + 0.001 * average_error
-            self.error = 0.99 * self.error + 0.01 * average_error
-
-        return total_error / iterations
+        return self._finish_training(total_error / iterations)
 
     def think(self, input_questions):
 
@@ -163,3 +375,123 @@ class NeuralNetwork:
 
         layers.append(self.non_linearity(numpy.dot(layers[-1], self.weights_list[-1]), final_layer=True))
         return layers[-1]
+
+    def _inference_state(self):
+        """
+        Float32 copies of the weights for 'infer': the bias row of the first
+        weights matrix is split off into its own vector.
+        :return: dict <- "weights", "padded_weights", "bias" and per batch
+            size "buffers"
+        """
+
+        if getattr(self, "_inference", None) is None:
+            # No copies of float32 weights (eg. mapped from a weights file).
+            first_weights = numpy.asarray(self.weights_list[0], dtype=numpy.float32)
+            weights = [first_weights[:-1]]
+            weights += [numpy.asarray(w, dtype=numpy.float32) for w in self.weights_list[1:]]
+            # Extra zero row so that index arrays can be padded.
+            padded_weights = getattr(self, "padded_first_weights", None)
+            if padded_weights is None:
+                padded_weights = numpy.zeros((len(weights[0]) + 1, weights[0].shape[1]),
+                                             dtype=numpy.float32)
+                padded_weights[:-1] = weights[0]
+            self._inference = {
+                "weights": weights,
+                "padded_weights": padded_weights,
+                "bias": first_weights[-1],
+                "buffers": {},
+            }
+        return self._inference
+
+    def _buffers(self, state, batch_size):
+        try:
+            return state["buffers"][batch_size]
+        except KeyError:
+            buffers = [numpy.empty((batch_size, w.shape[1]), dtype=numpy.float32)
+                       for w in state["weights"]]
+            state["buffers"][batch_size] = buffers
+            return buffers
+
+    def infer(self, input_questions, sigmoid=True):
+        """
+        Inference only version of 'think': float32, no bias column, no
+        clipping or nan scrubbing and no allocations after the first call with
+        a batch size.
+        NOTE: The returned array is reused by the next call with the same
+        batch size, copy it if it needs to be kept.
+        :param input_questions: numpy.array <- (batch size, inputs) inputs
+        :param sigmoid: bool <- False to get the output before the sigmoid
+        :return: numpy.array <- (batch size, outputs) outputs
+        """
+
+        state = self._inference_state()
+        weights = state["weights"]
+        buffers = self._buffers(state, len(input_questions))
+
+        inputs = numpy.asarray(input_questions, dtype=numpy.float32)
+        layer = numpy.dot(inputs, weights[0], out=buffers[0])
+        layer += state["bias"]
+        numpy.maximum(layer, 0., out=layer)
+        return self._infer_from(layer, 1, buffers, sigmoid)
+
+    def infer_sparse(self, active_inputs, sigmoid=True):
+        """
+        Same as 'infer' for inputs that are all 0 or 1, given as the indices of
+        the inputs that are 1. The first layer is then a sum of weight rows
+        instead of a dense matrix product.
+        NOTE: The returned array is reused like the one from 'infer'.
+        :param active_inputs: numpy.array <- indices of the active inputs of
+            one position (1d), or of a batch (2d, padded with the number of
+            inputs, which is an index to a row of zeros)
+        :param sigmoid: bool <- False to get the output before the sigmoid
+        :return: numpy.array <- (batch size, outputs) outputs
+        """
+
+        state = self._inference_state()
+        active_inputs = numpy.asarray(active_inputs)
+
+        if active_inputs.ndim == 1:
+            buffers = self._buffers(state, 1)
+            layer = buffers[0]
+            numpy.sum(state["weights"][0][active_inputs], axis=0, out=layer[0])
+        else:
+            buffers = self._buffers(state, len(active_inputs))
+            layer = buffers[0]
+            numpy.sum(state["padded_weights"][active_inputs], axis=1, out=layer)
+
+        layer += state["bias"]
+        numpy.maximum(layer, 0., out=layer)
+        return self._infer_from(layer, 1, buffers, sigmoid)
+
+    def infer_accumulated(self, accumulated, sigmoid=True):
+        """
+        Same as 'infer' for one position, given the sum of the first layer
+        weight rows of its active inputs (without the bias), eg. kept up to
+        date move by move. Only the layers above the first are computed.
+        NOTE: The returned array is reused like the one from 'infer'.
+        :param accumulated: numpy.array <- (first hidden layer size,) sum
+        :param sigmoid: bool <- False to get the output before the sigmoid
+        :return: numpy.array <- (1, outputs) outputs
+        """
+
+        state = self._inference_state()
+        buffers = self._buffers(state, 1)
+
+        layer = buffers[0]
+        numpy.add(accumulated, state["bias"], out=layer[0])
+        numpy.maximum(layer, 0., out=layer)
+        return self._infer_from(layer, 1, buffers, sigmoid)
+
+    def _infer_from(self, layer, start, buffers, sigmoid):
+        weights = self._inference["weights"]
+        for index in xrange(start, len(weights) - 1):
+            layer = numpy.dot(layer, weights[index], out=buffers[index])
+            numpy.maximum(layer, 0., out=layer)
+
+        output = numpy.dot(layer, weights[-1], out=buffers[-1])
+        if sigmoid:
+            numpy.negative(output, out=output)
+            numpy.exp(output, out=output)
+            output += 1.
+            numpy.reciprocal(output, out=output)
+        return output
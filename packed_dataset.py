@@ -0,0 +1,353 @@
+"""
+File: packed_dataset.py
+
+Description: Helper module for the packed dataset files, the binary
+counterpart of the text files of 'datafile_manager.py'. Every position is a
+fixed size record (see 'RECORD'), so a dataset can be memory-mapped and a batch
+is just an index into it: nothing is parsed, and the records are turned into
+network inputs a whole batch at a time ('to_input').
+
+Layout: 'MAGIC', then the version and the header length as little-endian
+uint32s, then the header as JSON (the record fields and any metadata), then
+the records from the next 'ALIGNMENT' byte boundary to the end of the file.
+The number of records comes from the size of the file, so records can be
+appended ('append_records') without rewriting the header.
+
+Usage: python packed_dataset.py [text data file] [packed file] [depth=N]
+    [canonical=1]
+
+Converts a text data file (as from 'collect_data*.py') to a packed file, with
+'canonical=1' keeping only one image of symmetric positions (training applies
+a random symmetry to every position anyway, see 'batch_pipeline.py').
+"""
+
+import json
+import os
+import struct
+import sys
+
+import numpy
+
+import datafile_manager
+import encoding
+
+MAGIC = "RVPACKED"
+VERSION = 1
+ALIGNMENT = 64
+
+PREFIX = struct.Struct("<II")
+
+# One position (24 bytes).
+#   black, white - bitboards of the discs (bit n is square n, row * 8 + col)
+#   side         - side to move (0 black, 1 white)
+#   depth        - search depth the label comes from (0 if unknown)
+#   result       - final disc difference for black (if 'FLAG_RESULT')
+#   flags        - 'FLAG_*' bits
+#   label        - win probability for black (the network target)
+RECORD = numpy.dtype([
+    ("black", "<u8"),
+    ("white", "<u8"),
+    ("side", "u1"),
+    ("depth", "u1"),
+    ("result", "i1"),
+    ("flags", "u1"),
+    ("label", "<f4"),
+])
+
+FLAG_RESULT = 1
+
+CHUNK_SIZE = 2 ** 16  # Records converted at a time.
+
+
+def _align(n):
+    return (n + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def empty_records(count):
+    return numpy.zeros(count, dtype=RECORD)
+
+
+def strings_to_records(positions, labels, depth=0):
+    """
+    Converts position strings and their labels into records.
+    :param positions: list <- position strings (as from 'Board.get_pieces')
+    :param labels: list <- win probabilities for black
+    :param depth: int <- search depth of the labels
+    :return: numpy.array <- (N,) 'RECORD' records
+    """
+
+    characters = numpy.frombuffer("".join(positions), dtype=numpy.uint8)
+    characters = characters.reshape(len(positions), 65)
+
+    records = empty_records(len(positions))
+    records["black"] = encoding.pack_squares(characters[:, :64] == ord("X"))
+    records["white"] = encoding.pack_squares(characters[:, :64] == ord("O"))
+    records["side"] = characters[:, 64] == ord("O")
+    records["depth"] = depth
+    records["label"] = labels
+    return records
+
+
+def records_to_strings(records):
+    """
+    Converts records back into position strings.
+    :param records: numpy.array <- 'RECORD' records
+    :return: list <- position strings
+    """
+
+    characters = numpy.empty((len(records), 65), dtype=numpy.uint8)
+    characters[:, :64] = ord("-")
+    characters[:, :64][encoding.unpack_bitboards(records["black"]) == 1] = \
+        ord("X")
+    characters[:, :64][encoding.unpack_bitboards(records["white"]) == 1] = \
+        ord("O")
+    characters[:, 64] = numpy.where(records["side"] == 0, ord("X"), ord("O"))
+    return [row.tostring() for row in characters]
+
+
+def canonical_records(records):
+    """
+    Replaces every position with its canonical image (the same image as
+    'bitboard.canonical' picks), so symmetric positions become equal.
+    :param records: numpy.array <- 'RECORD' records
+    :return: numpy.array <- new records
+    """
+
+    black_squares = encoding.unpack_bitboards(records["black"])
+    white_squares = encoding.unpack_bitboards(records["white"])
+
+    canonical = numpy.array(records, dtype=RECORD)
+    for table in encoding.SYMMETRIES:
+        black = encoding.pack_squares(black_squares[:, table])
+        white = encoding.pack_squares(white_squares[:, table])
+        # 'bitboard.canonical' compares 'black | white << 64'.
+        smaller = (white < canonical["white"]) | (
+            (white == canonical["white"]) & (black < canonical["black"]))
+        canonical["black"][smaller] = black[smaller]
+        canonical["white"][smaller] = white[smaller]
+    return canonical
+
+
+def unique_records(records):
+    """
+    Drops repeated positions (keeping the first record of each).
+    :param records: numpy.array <- 'RECORD' records
+    :return: numpy.array <- new records, in the same order
+    """
+
+    keys = numpy.empty(len(records), dtype=[("black", "<u8"), ("white", "<u8"),
+                                            ("side", "u1")])
+    for name in keys.dtype.names:
+        keys[name] = records[name]
+    _, first = numpy.unique(keys, return_index=True)
+    return records[numpy.sort(first)]
+
+
+def empties(records):
+    """
+    Counts the empty squares of every record.
+    :param records: numpy.array <- 'RECORD' records
+    :return: numpy.array <- (N,) int empties
+    """
+
+    occupied = encoding.unpack_bitboards(records["black"] | records["white"])
+    return 64 - occupied.sum(axis=1, dtype=numpy.int64)
+
+
+def select_empties(records, lowest, highest):
+    """
+    Keeps the records with 'lowest' to 'highest' (included) empty squares, eg.
+    to train a network for one stage of the game.
+    :param records: numpy.array <- 'RECORD' records
+    :param lowest: int <- fewest empties
+    :param highest: int <- most empties
+    :return: numpy.array <- the selected records (a copy)
+    """
+
+    counts = empties(records)
+    return records[(counts >= lowest) & (counts <= highest)]
+
+
+def to_input(records):
+    """
+    Converts a batch of records into network inputs.
+    :param records: numpy.array <- 'RECORD' records
+    :return: numpy.array <- (N, 130) float32 inputs
+    """
+
+    return encoding.bitboards_to_input(records["black"], records["white"],
+                                       records["side"])
+
+
+def to_output(records):
+    """
+    Gets the network targets of a batch of records.
+    :param records: numpy.array <- 'RECORD' records
+    :return: numpy.array <- (N, 1) float32 targets
+    """
+
+    return numpy.asarray(records["label"], dtype=numpy.float32).reshape(-1, 1)
+
+
+def _header(metadata):
+    fields = [[name, RECORD.fields[name][0].str] for name in RECORD.names]
+    return json.dumps({"fields": fields, "metadata": metadata or {}})
+
+
+def save_records(records, filename, metadata=None):
+    """
+    Saves records to a packed file (replacing it).
+    :param records: numpy.array <- 'RECORD' records
+    :param filename: str <- file to write
+    :param metadata: dict <- anything JSON serializable to keep in the header
+    :return: None
+    """
+
+    header = _header(metadata)
+    data_start = _align(len(MAGIC) + PREFIX.size + len(header))
+
+    save_file = open(filename, "wb")
+    save_file.write(MAGIC + PREFIX.pack(VERSION, len(header)) + header)
+    save_file.write("\0" * (data_start - save_file.tell()))
+    numpy.ascontiguousarray(records, dtype=RECORD).tofile(save_file)
+    save_file.close()
+
+
+def append_records(records, filename):
+    """
+    Adds records to the end of a packed file (creating it if needed).
+    :param records: numpy.array <- 'RECORD' records
+    :param filename: str <- file to write
+    :return: None
+    """
+
+    if not os.path.exists(filename):
+        save_records(records, filename)
+        return
+
+    read_header(filename)
+    save_file = open(filename, "ab")
+    numpy.ascontiguousarray(records, dtype=RECORD).tofile(save_file)
+    save_file.close()
+
+
+def read_header(filename):
+    """
+    Reads the header of a packed file.
+    :param filename: str <- file to read
+    :return: dict <- "fields", "metadata", "version", "data_start" and "count"
+    """
+
+    load_file = open(filename, "rb")
+    prefix = load_file.read(len(MAGIC) + PREFIX.size)
+    if prefix[:len(MAGIC)] != MAGIC:
+        load_file.close()
+        raise ValueError("'{}' is not a packed dataset".format(filename))
+
+    version, header_length = PREFIX.unpack(prefix[len(MAGIC):])
+    if version != VERSION:
+        load_file.close()
+        raise ValueError("'{}' has packed dataset version {} (this reads {})"
+                         .format(filename, version, VERSION))
+
+    header = json.loads(load_file.read(header_length))
+    load_file.close()
+
+    if [tuple(field) for field in header["fields"]] != \
+            [(name, RECORD.fields[name][0].str) for name in RECORD.names]:
+        raise ValueError("'{}' has unknown record fields".format(filename))
+
+    header["version"] = version
+    header["data_start"] = _align(len(prefix) + header_length)
+    header["count"] = ((os.path.getsize(filename) - header["data_start"]) //
+                       RECORD.itemsize)
+    return header
+
+
+def load_records(filename, mmap=True):
+    """
+    Loads the records of a packed file.
+    :param filename: str <- file to read
+    :param mmap: bool <- map the records (read-only) instead of reading them
+    :return: numpy.array <- (N,) 'RECORD' records
+    """
+
+    header = read_header(filename)
+
+    if mmap:
+        if header["count"] == 0:
+            return empty_records(0)
+        return numpy.memmap(filename, dtype=RECORD, mode="r",
+                            offset=header["data_start"],
+                            shape=(header["count"],))
+
+    load_file = open(filename, "rb")
+    load_file.seek(header["data_start"])
+    records = numpy.fromfile(load_file, dtype=RECORD, count=header["count"])
+    load_file.close()
+    return records
+
+
+def load(filename, mmap=True):
+    """
+    Loads a dataset of either kind: packed files are loaded with
+    'load_records', text files (ending in ".txt") are converted in memory.
+    :param filename: str <- file to read
+    :param mmap: bool <- map packed files instead of reading them
+    :return: numpy.array <- (N,) 'RECORD' records
+    """
+
+    if not filename.endswith(".txt"):
+        return load_records(filename, mmap)
+
+    data = datafile_manager.load_data(filename)
+    positions = data.keys()
+    return strings_to_records(positions, [data[k] for k in positions])
+
+
+def convert(text_file, packed_file, depth=0, canonical=False):
+    """
+    Converts a text data file into a packed file.
+    :param text_file: str <- file to read
+    :param packed_file: str <- file to write
+    :param depth: int <- search depth of the labels
+    :param canonical: bool <- store one image of symmetric positions (for
+        older data files, which have every position four times, rotated)
+    :return: int <- number of records written
+    """
+
+    data = datafile_manager.load_data(text_file)
+    positions = sorted(data.keys())
+
+    records = numpy.concatenate([empty_records(0)] + [
+        strings_to_records(positions[n: n + CHUNK_SIZE],
+                           [data[k] for k in positions[n: n + CHUNK_SIZE]],
+                           depth)
+        for n in xrange(0, len(positions), CHUNK_SIZE)])
+    if canonical:
+        records = unique_records(canonical_records(records))
+
+    save_records(records, packed_file,
+                 metadata={"source": os.path.basename(text_file),
+                           "canonical": canonical})
+    return len(records)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print "Usage: python packed_dataset.py [text data file] [packed file]" \
+              " [depth=N] [canonical=1]"
+        exit(1)
+
+    depth = 0
+    canonical = False
+    for argument in sys.argv[3:]:
+        attribute, value = argument.split("=")
+        if attribute == "depth":
+            depth = int(value)
+        elif attribute == "canonical":
+            canonical = bool(int(value))
+
+    count = convert(sys.argv[1], sys.argv[2], depth, canonical)
+    print "Wrote {} records to '{}' ({} KB)".format(
+        count, sys.argv[2], os.path.getsize(sys.argv[2]) // 1024)
@@ -14,10 +14,11 @@ TODO: Really clean up the code.
 
 print
 import sys
+import time
 
+IMPORT_START = time.time()
 sys.stdout.write("Importing modules.")
 sys.stdout.flush()
-import time
 # import math
 
 import searcher
@@ -26,6 +27,9 @@ import evaluator_nn
 import evaluator_test
 
 import searcher_test as searcher
+import search_thread
+import evaluation_cache
+import model_loader
 
 sys.stdout.write(".")
 sys.stdout.flush()
@@ -38,13 +42,28 @@ try:
 except ImportError:
     GRAPH = False
 
-sys.stdout.write(". Done\n")
+sys.stdout.write(". Done ({} ms)\n".format(
+    round(1000 * (time.time() - IMPORT_START), 1)))
 sys.stdout.flush()
+# The models are loaded on first use, so this should be (next to) nothing.
+print model_loader.report()
 print
 
 FIRST_EVALUATOR = evaluator_test.evaluate
 SECOND_EVALUATOR = evaluator_nn.evaluate
 
+CACHE = True  # Cache the evaluations (across games too) in memory.
+if CACHE:
+    FIRST_EVALUATOR = evaluation_cache.cached(FIRST_EVALUATOR, symmetric=False)
+    SECOND_EVALUATOR = evaluation_cache.cached(SECOND_EVALUATOR,
+                                               symmetric=False)
+
+PONDER = True
+MAX_MEMORY = None  # In megabytes per searcher, None for no limit.
+# Pondering has no time limit, so the tree needs a limit: the 'MAX_MEMORY' used
+# when pondering without one.
+PONDER_MEMORY = 256
+
 LEVEL = 0
 SPEED_FACTOR = 9 - LEVEL
 MINIMUM_DEPTH = 2
@@ -79,6 +98,8 @@ def computer_move_timed(engine):
     engine.timed_expand(TIME[turn])
 
     while engine.fully_expanded - int(not engine.caught_up) < MINIMUM_DEPTH:
+        if engine.memory_limited:
+            break
         # if engine.board.side == 0 and \
         #         not engine.fully_expanded - int(not engine.caught_up) < MINIMUM_DEPTH:
         #     break
@@ -160,6 +181,10 @@ def human_move(engine):
 
     print "Legal moves:", engine.board.legal_moves_notation
 
+    ponder = None
+    if PONDER:
+        ponder = search_thread.start_ponder(engine)
+
     while True:
 
         move = raw_input("Your move: ")
@@ -172,13 +197,25 @@ def human_move(engine):
             move = None
             break
 
+    if ponder is not None:
+        ponder.cancel()
+
     print
     engine.move(move)
     engine.board.display()
 
 
 def main():
-    bot = searcher.Searcher((FIRST_EVALUATOR, SECOND_EVALUATOR))
+    max_memory = MAX_MEMORY
+    if max_memory is None and PONDER:
+        max_memory = PONDER_MEMORY
+
+    max_nodes = None
+    if max_memory is not None:
+        max_nodes = searcher.nodes_for_memory(max_memory)
+
+    bot = searcher.Searcher((FIRST_EVALUATOR, SECOND_EVALUATOR),
+                            max_nodes=max_nodes)
     bot.board.display()
     bot.expand()
 
@@ -201,6 +238,11 @@ def main():
 
     print "Final score:", " - ".join(map(str, bot.board.score()))
 
+    if CACHE:
+        stats = evaluation_cache.SHARED_CACHE.stats()
+        print "Evaluation cache: {}% hits ({} entries)".format(
+            round(100 * stats["hit_rate"], 1), stats["entries"])
+
 
 if __name__ == "__main__":
     turn = 0
@@ -0,0 +1,280 @@
+#! /usr/bin/python
+
+"""
+File: quantized_network.py
+
+Description: Int8 copy of a trained 'NeuralNetwork' for inference. Every
+weights matrix is stored as int8 with one scale per layer, and the hidden
+activations are requantized to int8 between layers with scales calibrated on
+sample positions. Only the int8 weights are kept: numpy has no int8 matrix
+product, so every product widens its weights into one reused float32 buffer
+and multiplies the (integer valued) activations in float32, which is exact as
+long as the sums stay below 2 ** 24 (checked when quantizing). The inputs are
+all 0 or 1, so the first layer is exact apart from the rounding of its
+weights.
+
+Usage: python quantized_network.py [network file] [data file]
+
+Quantizes the network, reports how far its outputs drift from float inference
+on held-out positions of the data file (held out with all their symmetric
+images, so no rotated copy of a calibration position is measured) and saves it
+to 'network_int8.pkl'.
+"""
+
+import cPickle
+import math
+import random
+import sys
+import time
+
+import numpy
+
+import bitboard
+import datafile_manager
+import encoding
+import model_loader
+
+INSTANCE_FILE = "network.weights"
+DATA_FILE = "training_data_catered.txt"
+SAVE_FILE = "network_int8.pkl"
+
+CALIBRATION_SIZE = 2000
+HOLDOUT = 0.1
+SEED = 0
+
+INT8_MAX = 127
+EXACT_FLOAT32 = 2 ** 24  # Integers up to this are exact in float32.
+
+
+def printf(s):
+    sys.stdout.write(s)
+    sys.stdout.flush()
+
+
+def quantize(x, scale):
+    return numpy.clip(numpy.round(x / scale), -INT8_MAX, INT8_MAX).astype(
+        numpy.int8)
+
+
+class QuantizedNetwork:
+    def __init__(self, network, calibration_inputs):
+        """
+        Quantizes a trained network.
+        :param network: neural_network.NeuralNetwork() <- network to quantize
+        :param calibration_inputs: numpy.array <- (N, inputs) sample inputs
+            used to pick the scale of every hidden layer
+        """
+
+        first_weights = numpy.asarray(network.weights_list[0], numpy.float32)
+        float_weights = [first_weights[:-1]]
+        float_weights += [numpy.asarray(w, dtype=numpy.float32)
+                          for w in network.weights_list[1:]]
+        float_bias = first_weights[-1]
+
+        self.weight_scales = [float(numpy.abs(w).max()) / INT8_MAX
+                              for w in float_weights]
+        self.weights = [quantize(w, scale) for w, scale
+                        in zip(float_weights, self.weight_scales)]
+        for index, weights in enumerate(self.weights[1:]):
+            if weights.shape[0] * INT8_MAX ** 2 >= EXACT_FLOAT32:
+                raise ValueError("layer {} is too wide for exact float32 "
+                                 "sums".format(index + 1))
+        # Padded with a row of zeros for batches of index arrays.
+        self.padded_weights = numpy.vstack(
+            [self.weights[0], numpy.zeros((1, self.weights[0].shape[1]),
+                                          dtype=numpy.int8)])
+        # The inputs have a scale of 1, so the bias is at the weights' scale.
+        self.bias = numpy.round(
+            float_bias / self.weight_scales[0]).astype(numpy.int32)
+
+        # Scale of every hidden layer: its largest (float) calibration value.
+        self.activation_scales = []
+        layer = numpy.maximum(
+            numpy.dot(calibration_inputs, float_weights[0]) + float_bias, 0.)
+        for weights in float_weights[1:]:
+            self.activation_scales.append(
+                max(float(layer.max()), 10 ** -8) / INT8_MAX)
+            layer = numpy.maximum(numpy.dot(layer, weights), 0.)
+
+        # Multiplier from the integer sum of a layer to the int8 activations of
+        # the next one, and from the last sum to the (float) output.
+        input_scales = [1.0] + self.activation_scales
+        self.multipliers = [
+            input_scale * weight_scale / output_scale
+            for input_scale, weight_scale, output_scale
+            in zip(input_scales, self.weight_scales, self.activation_scales)]
+        self.output_scale = input_scales[-1] * self.weight_scales[-1]
+
+        self._buffer = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop("_buffer", None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._buffer = None
+
+    def _widen(self, weights):
+        # numpy has no int8 matrix product (int8 . int8 wraps around in int8),
+        # so the weights are widened for one product at a time.
+        if self._buffer is None:
+            self._buffer = numpy.empty(max(w.size for w in self.weights),
+                                       dtype=numpy.float32)
+        widened = self._buffer[:weights.size].reshape(weights.shape)
+        widened[...] = weights
+        return widened
+
+    def nbytes(self):
+        return sum(w.nbytes for w in self.weights) + self.bias.nbytes
+
+    def _requantize(self, accumulator, multiplier):
+        # ReLU and rounding in one: the activations are in [0, 127].
+        layer = numpy.rint(accumulator * multiplier)
+        return numpy.clip(layer, 0, INT8_MAX).astype(numpy.float32)
+
+    def _infer_from(self, accumulator, sigmoid):
+        for index, weights in enumerate(self.weights[1:]):
+            layer = self._requantize(accumulator, self.multipliers[index])
+            accumulator = numpy.dot(layer, self._widen(weights))
+
+        output = accumulator * self.output_scale
+        if sigmoid:
+            return 1 / (1 + numpy.exp(-numpy.clip(output, -64, 64)))
+        return output
+
+    def infer(self, input_questions, sigmoid=True):
+        """
+        Same as 'NeuralNetwork.infer', with int8 weights.
+        :param input_questions: numpy.array <- (batch size, inputs) inputs,
+            all 0 or 1
+        :param sigmoid: bool <- False to get the output before the sigmoid
+        :return: numpy.array <- (batch size, outputs) outputs
+        """
+
+        inputs = numpy.asarray(input_questions, dtype=numpy.float32)
+        accumulator = numpy.dot(inputs, self._widen(self.weights[0]))
+        accumulator += self.bias
+        return self._infer_from(accumulator, sigmoid)
+
+    def infer_sparse(self, active_inputs, sigmoid=True):
+        """
+        Same as 'NeuralNetwork.infer_sparse', with int8 weights: the first
+        layer sums int8 weight rows into int32.
+        :param active_inputs: numpy.array <- indices of the active inputs of
+            one position (1d), or of a batch (2d, padded with the number of
+            inputs)
+        :param sigmoid: bool <- False to get the output before the sigmoid
+        :return: numpy.array <- (batch size, outputs) outputs
+        """
+
+        active_inputs = numpy.asarray(active_inputs)
+        if active_inputs.ndim == 1:
+            accumulator = self.weights[0][active_inputs].sum(
+                axis=0, dtype=numpy.int32)[None]
+        else:
+            accumulator = self.padded_weights[active_inputs].sum(
+                axis=1, dtype=numpy.int32)
+        accumulator += self.bias
+        return self._infer_from(accumulator, sigmoid)
+
+
+def drift(network, quantized, inputs, labels):
+    """
+    Compares the quantized network with float inference.
+    :param network: neural_network.NeuralNetwork() <- original network
+    :param quantized: QuantizedNetwork() <- quantized copy
+    :param inputs: numpy.array <- (N, inputs) held-out inputs
+    :param labels: numpy.array <- (N,) held-out labels
+    :return: dict <- drift statistics
+    """
+
+    float_logits = network.infer(inputs, sigmoid=False)[:, 0].astype(
+        numpy.float64)
+    int8_logits = quantized.infer(inputs, sigmoid=False)[:, 0]
+    float_outputs = 1 / (1 + numpy.exp(-float_logits))
+    int8_outputs = 1 / (1 + numpy.exp(-int8_logits))
+
+    # Centidiscs as in 'evaluator_nn' with 'LOOK_NICE'.
+    score_difference = 100 * numpy.abs(float_logits - int8_logits)
+
+    return {
+        "output_mean": float(numpy.mean(numpy.abs(float_outputs -
+                                                  int8_outputs))),
+        "output_max": float(numpy.max(numpy.abs(float_outputs -
+                                                int8_outputs))),
+        "score_mean": float(numpy.mean(score_difference)),
+        "score_max": float(numpy.max(score_difference)),
+        "same_side": float(numpy.mean((float_logits > 0) ==
+                                      (int8_logits > 0))),
+        "float_error": float(numpy.mean(numpy.abs(float_outputs - labels))),
+        "int8_error": float(numpy.mean(numpy.abs(int8_outputs - labels))),
+    }
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        INSTANCE_FILE = sys.argv[1]
+    if len(sys.argv) > 2:
+        DATA_FILE = sys.argv[2]
+
+    brain = model_loader.load_network(INSTANCE_FILE)
+
+    try:
+        printf("Loading data file... ")
+        data = datafile_manager.load_data(DATA_FILE)
+        printf("Done\n")
+    except IOError:
+        printf("Data file not found, quitting... \n")
+        exit(0)
+
+    # Older data files have every position four times (rotated): hold out
+    # whole positions, with all their images.
+    images = {}
+    for position in sorted(data.keys()):
+        images.setdefault(bitboard.canonical_string(position),
+                          []).append(position)
+    canonical = sorted(images.keys())
+    random.Random(SEED).shuffle(canonical)
+    holdout_size = int(math.ceil(HOLDOUT * len(canonical)))
+    held_out = [position for key in canonical[:holdout_size]
+                for position in images[key]]
+    calibration = [position for key in canonical[holdout_size:]
+                   for position in images[key]][:CALIBRATION_SIZE]
+
+    # Pickle the class of the module rather than of '__main__'.
+    from quantized_network import QuantizedNetwork
+
+    printf("Quantizing network... ")
+    net = QuantizedNetwork(brain, encoding.strings_to_input(calibration))
+    printf("Done\n")
+
+    held_out_inputs = encoding.strings_to_input(held_out)
+    held_out_labels = numpy.array([data[position] for position in held_out])
+    stats = drift(brain, net, held_out_inputs, held_out_labels)
+
+    float_size = sum(w.size for w in brain.weights_list) * 4
+    printf("Weights: {} KB (float32) -> {} KB (int8)\n".format(
+        float_size // 1024, net.nbytes() // 1024))
+    printf("Drift over {} held-out positions:\n".format(len(held_out)))
+    printf("  Output: mean {} / max {}\n".format(
+        round(stats["output_mean"], 5), round(stats["output_max"], 5)))
+    printf("  Score: mean {} / max {} centidiscs\n".format(
+        round(stats["score_mean"], 2), round(stats["score_max"], 2)))
+    printf("  Same side of 0.5: {}%\n".format(
+        round(100 * stats["same_side"], 2)))
+    printf("  Error against the labels: {} (float) / {} (int8)\n".format(
+        round(stats["float_error"], 5), round(stats["int8_error"], 5)))
+
+    for name, inference in (("float", brain), ("int8", net)):
+        start_time = time.time()
+        for _ in xrange(1000):
+            inference.infer(held_out_inputs[:1], sigmoid=False)
+        printf("Single position ({}): {} us\n".format(
+            name, round(1000 * (time.time() - start_time), 1)))
+
+    f = open(SAVE_FILE, "wb")
+    cPickle.dump(net, f, protocol=cPickle.HIGHEST_PROTOCOL)
+    f.close()
+    printf("Saved to '{}'\n".format(SAVE_FILE))
@@ -21,6 +21,7 @@ CONVERSION_CHART = {
     1: "O",
     2: "-"
 }
+PIECE_CHART = {piece: number for number, piece in CONVERSION_CHART.items()}
 
 NUMBER_TO_PIECE = {
     2: "  ",
@@ -78,6 +79,7 @@ AVAILABLE_POSITIONS.remove((3, 3))
 AVAILABLE_POSITIONS.remove((3, 4))
 AVAILABLE_POSITIONS.remove((4, 3))
 AVAILABLE_POSITIONS.remove((4, 4))
+CENTER_POSITIONS = [(3, 3), (3, 4), (4, 3), (4, 4)]
 
 
 class Board:
@@ -91,14 +93,21 @@ class Board:
         a particular piece representation in 'pieces'. If 'copied' is True,
         don't set the variables because they are expected to be set after
         creation as in the __deepcopy__ function.
+
+        'self.trackers' holds incrementally updated state for evaluators
+        (by name): objects with a 'copy()' method and an
+        'update(coordinate, flipped, side)' method which is called after
+        every move that places a piece.
         """
         if not copied:
             self.pieces = pieces
             self.side = side
             self.available_positions = AVAILABLE_POSITIONS[:]
+            self.trackers = {}
 
             if pieces is None:
-                self.pieces = [row[:] for row in START_POSITION]
+                # A fresh list: slices of the numpy rows would be views.
+                self.pieces = START_POSITION.tolist()
                 self.legal_moves = [move[:] for move in STARTING_LEGAL_MOVES]
                 self.legal_moves_notation = STARTING_LEGAL_MOVES_NOTATION[:]
             else:
@@ -115,6 +124,8 @@ class Board:
         new_instance.available_positions = list(self.available_positions)
         new_instance.legal_moves = list(self.legal_moves)
         new_instance.legal_moves_notation = list(self.legal_moves_notation)
+        new_instance.trackers = {name: tracker.copy() for name, tracker
+                                 in self.trackers.iteritems()}
 
         return new_instance
 
@@ -156,8 +167,8 @@ class Board:
                     opposite_side:
                 temporary = around_functions[index](coordinate[0],
                                                     coordinate[1])
-                while self.pieces[temporary[0]][temporary[1]] != EMPTY and \
-                        not self.out_of_bounds(temporary):
+                while not self.out_of_bounds(temporary) and \
+                        self.pieces[temporary[0]][temporary[1]] != EMPTY:
                     if self.pieces[temporary[0]][temporary[1]] == self.side:
                         return True
                     temporary = around_functions[index](
@@ -231,9 +242,10 @@ class Board:
         """
         Updates the board. Called by 'self.move()'
         :param coordinate: coordinate of the move received from 'self.move()'
-        :return: None
+        :return: list <- coordinates of the flipped pieces
         """
 
+        flipped = []
         directions = self._legal_position_directions(coordinate)
         for direction_function in directions:
             temporary = coordinate[:]
@@ -245,8 +257,10 @@ class Board:
                     break
                 if self.pieces[temporary[0]][temporary[1]] == (not self.side):
                     self.pieces[temporary[0]][temporary[1]] = self.side
+                    flipped.append(temporary)
 
         self.pieces[coordinate[0]][coordinate[1]] = self.side
+        return flipped
 
     def move(self, notation=None, refresh_moves=True):
         """
@@ -262,9 +276,12 @@ class Board:
         #     return None
 
         if notation is not None:
-            self._update_board(self.convert_to_coordinate(notation))
-            self.available_positions.remove(
-                self.convert_to_coordinate(notation))
+            coordinate = self.convert_to_coordinate(notation)
+            flipped = self._update_board(coordinate)
+            self.available_positions.remove(coordinate)
+
+            for tracker in self.trackers.itervalues():
+                tracker.update(coordinate, flipped, self.side)
 
         self.side = int(not self.side)
 
@@ -324,6 +341,27 @@ class Board:
         return pieces + CONVERSION_CHART[self.side]
 
 
+def from_string(position):
+    """
+    Creates a board from a position string (as from 'Board.get_pieces').
+    :param position: str <- 64 squares of "X", "O" or "-" and the side to move
+    :return: Board() <- the position
+    """
+
+    pieces = [[PIECE_CHART[position[8 * row + column]] for column in range(8)]
+              for row in range(8)]
+    board = Board(copied=True)
+    board.pieces = pieces
+    board.side = PIECE_CHART[position[64]]
+    board.available_positions = [coordinate for coordinate in
+                                 AVAILABLE_POSITIONS + CENTER_POSITIONS
+                                 if pieces[coordinate[0]][coordinate[1]] ==
+                                 EMPTY]
+    board.trackers = {}
+    board.update_legal_moves()
+    return board
+
+
 if __name__ == "__main__":
     b = Board()
     b.display()
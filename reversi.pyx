@@ -37,6 +37,7 @@ CONVERSION_CHART = {
     1: "O",
     2: "-"
 }
+PIECE_CHART = {piece: number for number, piece in CONVERSION_CHART.items()}
 
 STARTING_LEGAL_MOVES = [(2, 3), (3, 2), (4, 5), (5, 4)]
 STARTING_LEGAL_MOVES_NOTATION = ['d3', 'c4', 'f5', 'e6']
@@ -104,6 +105,7 @@ AVAILABLE_POSITIONS.remove((3, 3))
 AVAILABLE_POSITIONS.remove((3, 4))
 AVAILABLE_POSITIONS.remove((4, 3))
 AVAILABLE_POSITIONS.remove((4, 4))
+CENTER_POSITIONS = [(3, 3), (3, 4), (4, 3), (4, 4)]
 
 
 cpdef signed char out_of_bounds(signed char row, signed char column):
@@ -114,6 +116,11 @@ class Board:
     def __init__(self, pieces=None, side=BLACK, copied=False):
         """
         Creates a board instance, used for finding legal moves.
+
+        'self.trackers' holds incrementally updated state for evaluators
+        (by name): objects with a 'copy()' method and an
+        'update(coordinate, flipped, side)' method which is called after
+        every move that places a piece.
         :param pieces: 2d list
         """
 
@@ -121,6 +128,7 @@ class Board:
             self.pieces = pieces
             self.side = side
             self.available_positions = AVAILABLE_POSITIONS[:]
+            self.trackers = {}
 
             if pieces is None:
                 # self.pieces = [row[:] for row in START_POSITION]
@@ -140,6 +148,8 @@ class Board:
 
         new_instance.legal_moves = list(self.legal_moves)
         new_instance.legal_moves_notation = list(self.legal_moves_notation)
+        new_instance.trackers = {name: tracker.copy() for name, tracker
+                                 in self.trackers.iteritems()}
 
         return new_instance
 
@@ -251,10 +261,11 @@ class Board:
         """
         Updates the board. Called by 'self.move()'
         :param coordinate: coordinate of the move received from 'self.move()'
-        :return: None
+        :return: list <- coordinates of the flipped pieces
         """
 
         cdef signed char opposite_side, row, column
+        flipped = []
         opposite_side = not self.side
         directions = self._legal_position_directions(coordinate)
         for direction_function in directions:
@@ -267,8 +278,10 @@ class Board:
                     break
                 if self.pieces[row][column] == opposite_side:
                     self.pieces[row][column] = self.side
+                    flipped.append((row, column))
 
         self.pieces[coordinate[0]][coordinate[1]] = self.side
+        return flipped
 
     def move(self, notation=None, refresh_moves=True):
         """
@@ -283,8 +296,12 @@ class Board:
         #     return None
 
         if notation is not None:
-            self._update_board(self.convert_to_coordinate(notation))
-            self.available_positions.remove(self.convert_to_coordinate(notation))
+            coordinate = self.convert_to_coordinate(notation)
+            flipped = self._update_board(coordinate)
+            self.available_positions.remove(coordinate)
+
+            for tracker in self.trackers.itervalues():
+                tracker.update(coordinate, flipped, self.side)
 
         self.side = int(not self.side)
 
@@ -343,6 +360,27 @@ class Board:
         return pieces + CONVERSION_CHART[self.side]
 
 
+def from_string(position):
+    """
+    Creates a board from a position string (as from 'Board.get_pieces').
+    :param position: str <- 64 squares of "X", "O" or "-" and the side to move
+    :return: Board() <- the position
+    """
+
+    pieces = [[PIECE_CHART[position[8 * row + column]] for column in range(8)]
+              for row in range(8)]
+    board = Board(copied=True)
+    board.pieces = pieces
+    board.side = PIECE_CHART[position[64]]
+    board.available_positions = [coordinate for coordinate in
+                                 AVAILABLE_POSITIONS + CENTER_POSITIONS
+                                 if pieces[coordinate[0]][coordinate[1]] ==
+                                 EMPTY]
+    board.trackers = {}
+    board.update_legal_moves()
+    return board
+
+
 if __name__ == "__main__":
     b = Board()
     b.display()
@@ -0,0 +1,209 @@
+"""
+File: search_thread.py
+
+Description: Runs a searcher on a background thread so that the caller (the
+Tkinter main loop, a server, ...) doesn't block while the engine thinks. A
+search is started with 'start_search' (or 'start_ponder' on the opponent's
+time) and returns a handle which can be polled for per-depth progress and
+stopped at any time to get the best move so far.
+
+NOTE: Only one search should run on a searcher at a time, and the searcher
+shouldn't be touched by anyone else until the handle is done (the board's legal
+moves can still be read while pondering).
+"""
+
+import threading
+import time
+
+from searcher import SearchStopped
+
+INFINITY = 10 ** 6
+
+
+class SearchHandle:
+    def __init__(self, engine, t=INFINITY, minimum_depth=1, maximum_depth=None,
+                 callback=None):
+        """
+        Handle to a search running on a background thread.
+        :param engine: searcher.Searcher() <- the searcher to run
+        :param t: float <- time limit in seconds
+        :param minimum_depth: int <- depth to reach even if the time runs out
+        :param maximum_depth: int <- depth at which to stop early (or None)
+        :param callback: function <- called with every progress entry (from
+            the search thread, so don't touch Tkinter in there)
+        """
+
+        self.engine = engine
+        self.time_limit = t
+        self.minimum_depth = minimum_depth
+        self.maximum_depth = maximum_depth
+        self.callback = callback
+
+        self.progress = []
+        self.cancelled = False
+        self.interrupted = False
+        self.error = None
+
+        self._finished = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+
+    def start(self):
+        self.engine.stop_requested = False
+        self._thread.start()
+        return self
+
+    def _depth(self):
+        return self.engine.fully_expanded - int(not self.engine.caught_up)
+
+    def _run(self):
+        engine = self.engine
+        start_time = time.time()
+        end_time = start_time + self.time_limit
+
+        try:
+            # Whatever is left over from an earlier search is the first result.
+            if self._depth() >= 1 and all(hasattr(child, "score") for child in
+                                          engine.game_tree.children):
+                self._report(0.0)
+
+            while not self._stopped.is_set():
+                depth = self._depth()
+                if depth >= self.minimum_depth and time.time() >= end_time:
+                    break
+                if self.maximum_depth is not None and \
+                        depth >= self.maximum_depth:
+                    break
+                if engine.fully_expanded > 64 - engine.pieces + 1:
+                    break
+                if engine.memory_limited:
+                    break
+
+                if depth < self.minimum_depth:
+                    engine.expand()
+                else:
+                    engine.expand(end_time - time.time())
+
+                if engine.caught_up and not self._stopped.is_set():
+                    engine.update_scores()
+                    self._report(time.time() - start_time)
+
+            if not self.cancelled and self._depth() >= 1:
+                engine.update_scores()
+        except SearchStopped:
+            self.interrupted = True
+        except Exception as error:
+            self.error = error
+        finally:
+            engine.stop_requested = False
+            self._finished.set()
+
+    def _report(self, elapsed):
+        entry = {
+            "depth": self._depth(),
+            "score": self.engine.game_tree.score,
+            "pv": self.engine.principal_variation(),
+            "nodes": self.engine.number_nodes(),
+            "time": elapsed,
+        }
+        self.progress.append(entry)
+
+        if self.callback is not None:
+            self.callback(entry)
+
+    def latest(self):
+        """
+        Gets the progress of the deepest finished iteration.
+        :return: dict <- depth, score, pv, nodes and time <OR> None
+        """
+
+        if self.progress:
+            return self.progress[-1]
+        return None
+
+    def done(self):
+        return self._finished.is_set()
+
+    def wait(self, timeout=None):
+        """
+        Waits for the search to finish.
+        :param timeout: float <- maximum time to wait in seconds (or None)
+        :return: bool <- whether the search has finished
+        """
+
+        self._finished.wait(timeout)
+        return self.done()
+
+    def stop(self):
+        """
+        Stops the search as soon as possible and waits for it to finish.
+        :return: the "best" move found so far in notation format
+        """
+
+        self._stopped.set()
+        self.engine.stop_requested = True
+        self.wait()
+        return self.best_move()
+
+    def cancel(self):
+        """
+        Stops the search without scoring the unfinished iteration.
+        :return: None
+        """
+
+        self.cancelled = True
+        self._stopped.set()
+        self.engine.stop_requested = True
+        self.wait()
+
+    def best_move(self):
+        """
+        Waits for the search and returns the move the engine thinks is best.
+        :return: the "best" move in notation format -> (eg. "c4")
+        """
+
+        self.wait()
+        if self.error is not None:
+            raise self.error
+
+        # The scores are half updated, so fall back on the last full iteration.
+        if self.interrupted:
+            if self.progress:
+                return self.progress[-1]["pv"][0]
+            self.engine.update_scores()
+
+        return self.engine.best_move()
+
+
+def start_search(engine, t=INFINITY, minimum_depth=1, maximum_depth=None,
+                 callback=None):
+    """
+    Starts searching the current position of 'engine' in the background.
+    :param engine: searcher.Searcher() <- the searcher to run
+    :param t: float <- time limit in seconds
+    :param minimum_depth: int <- depth to reach even if the time runs out
+    :param maximum_depth: int <- depth at which to stop early (or None)
+    :param callback: function <- called with every progress entry
+    :return: SearchHandle() <- the running search
+    """
+
+    return SearchHandle(engine, t, minimum_depth, maximum_depth,
+                        callback).start()
+
+
+def start_ponder(engine, maximum_depth=None, callback=None):
+    """
+    Starts searching the current position on the opponent's time. Cancel the
+    handle once the opponent has moved: 'engine.move' then keeps the subtree
+    (and table entries) of the move that was played, so the next search carries
+    on from there instead of starting over.
+    :param engine: searcher.Searcher() <- the searcher to run
+    :param maximum_depth: int <- depth at which to stop pondering (or None)
+    :param callback: function <- called with every progress entry
+    :return: SearchHandle() <- the running search
+    """
+
+    engine.pondering = True
+    return SearchHandle(engine, maximum_depth=maximum_depth,
+                        callback=callback).start()
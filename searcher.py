@@ -35,14 +35,36 @@ START_POSITION = [
 
 TRANSPOSITION_TABLE = {}
 
+# Rough bytes per node: the board and the anytree node (measured about 4.5 KB),
+# and the 'nn' accumulator copied with every board (about 2 KB more).
+NODE_SIZE = 6600
+EVICTION_TARGET = 0.75
+EVICTION_DEPTH = 4
+
+
+class SearchStopped(Exception):
+    """Raised while scoring the tree once 'stop_requested' is set."""
+    pass
+
+
+def nodes_for_memory(megabytes):
+    """
+    Converts a memory budget to a (rough) node budget for 'Searcher'.
+    :param megabytes: float <- memory budget in megabytes
+    :return: int <- number of nodes
+    """
+
+    return int(megabytes * 1024 * 1024 / NODE_SIZE)
+
 
 class Searcher:
-    def __init__(self, evaluators, pieces=None, side=BLACK):
+    def __init__(self, evaluators, pieces=None, side=BLACK, max_nodes=None):
         """
         Searcher instance: an engine which finds the "best" move for the current
         board state.
         :param pieces: 2d list <- arrangement of pieces on the board
         :param side: side to play next
+        :param max_nodes: int <- hard limit on the size of the tree (or None)
         """
 
         if pieces is None:
@@ -53,20 +75,30 @@ class Searcher:
         self.pieces = 4
 
         self.evaluators = evaluators
-        self.board = reversi.Board(pieces, side)
+        # Copied: the board is played on in place.
+        self.board = reversi.Board([list(row) for row in pieces], side)
         self.game_tree = anytree.Node(self.board)
 
         self.caught_up = True
+        self.stop_requested = False
+        self.pondering = False
+
+        self.max_nodes = max_nodes
+        self.node_count = 1
+        self.memory_limited = False
+        self.evicted_depth = None  # 'fully_expanded' of the last eviction.
 
     @staticmethod
-    def expand_node(node):
+    def expand_node(node, refresh_moves=True):
         """
         Expands a particular node by depth one.
         :param node: anytree.Node() <- the node to expand
+        :param refresh_moves: bool <- whether the legal moves need refreshing
         :return: None
         """
 
-        node.name.update_legal_moves()
+        if refresh_moves:
+            node.name.update_legal_moves()
 
         for move in node.name.legal_moves_notation:
             new_board = copy.deepcopy(node.name)
@@ -76,8 +108,8 @@ class Searcher:
     def expand(self, t=INFINITY):
         """
         Increments 'self.fully_expanded', then expands the entire tree to a
-        depth of 'self.fully_expanded' in the time alloted. If incomplete, just
-        leaves as is.
+        depth of 'self.fully_expanded' in the time alloted (or until
+        'self.stop_requested' is set). If incomplete, just leaves as is.
         :param t: int <- time limit in seconds
         :return: None
         """
@@ -92,13 +124,75 @@ class Searcher:
         for node in anytree.LevelOrderIter(self.game_tree):
             if node.depth >= self.fully_expanded:
                 break
-            if time.time() > stop_time:
+            if time.time() > stop_time or self.stop_requested:
                 return
-            if node.is_leaf:
-                self.expand_node(node)
+            if node.is_leaf and not hasattr(node, "evicted"):
+                node.name.update_legal_moves()
+                if self.max_nodes is not None and self.fully_expanded > 1 and \
+                        self.node_count + len(node.name.legal_moves_notation) > \
+                        self.max_nodes:
+                    # One eviction per depth: evicting again would only throw
+                    # away what this depth has grown since.
+                    if self.evicted_depth == self.fully_expanded or \
+                            not self.evict():
+                        self.memory_limited = True
+                    self.evicted_depth = self.fully_expanded
+                    return
+                self.expand_node(node, refresh_moves=False)
+                self.node_count += len(node.children)
 
         self.caught_up = True
 
+    @staticmethod
+    def prune(node):
+        """
+        Throws away everything below 'node', keeping its backed up score.
+        :param node: anytree.Node() <- the node to prune
+        :return: int <- the number of nodes removed
+        """
+
+        descendants = node.descendants
+        for descendant in descendants:
+            TRANSPOSITION_TABLE.pop(descendant.name, None)
+
+        node.children = []
+        node.evicted = True
+        return len(descendants)
+
+    def evict(self):
+        """
+        Prunes the least promising subtrees (those scored furthest below their
+        best sibling by the last minimax) until the tree is back under
+        'EVICTION_TARGET' of 'self.max_nodes'.
+        :return: bool <- whether enough nodes could be freed
+        """
+
+        target = int(EVICTION_TARGET * self.max_nodes)
+
+        candidates = []
+        for node in anytree.PreOrderIter(self.game_tree,
+                                         maxlevel=EVICTION_DEPTH):
+            children = [child for child in node.children
+                        if hasattr(child, "score") and not child.is_leaf]
+            if len(children) < 2:
+                continue
+
+            if (node.depth + self.board.side) % 2 == 0:
+                best = max(child.score for child in children)
+                candidates += [(best - child.score, child) for child in children]
+            else:
+                best = min(child.score for child in children)
+                candidates += [(child.score - best, child) for child in children]
+
+        candidates.sort(key=lambda c: c[0], reverse=True)
+        for loss, node in candidates:
+            if self.node_count <= target or loss <= 0:
+                break
+            if node.root is self.game_tree:
+                self.node_count -= self.prune(node)
+
+        return self.node_count <= target
+
     def timed_expand(self, t):
         """
         Expands as much as possible in the time allotted.
@@ -111,6 +205,8 @@ class Searcher:
         while time.time() < end_time:
             if self.fully_expanded > 64 - self.pieces + 1:
                 break
+            if self.memory_limited:
+                break
 
             starting_nodes = self.number_nodes()
             time1 = time.time()
@@ -135,10 +231,15 @@ class Searcher:
         :return: None
         """
 
+        if hasattr(node, "evicted"):
+            return
+
         if node.depth >= self.fully_expanded - int(not self.caught_up):
             if node.name in TRANSPOSITION_TABLE:
                 node.score = TRANSPOSITION_TABLE[node.name]
             else:
+                if self.stop_requested:
+                    raise SearchStopped()
                 score = self.evaluators[self.board.side](node.name)
                 TRANSPOSITION_TABLE[node.name] = score
                 node.score = score
@@ -212,13 +313,41 @@ class Searcher:
                 self.board.move(notation)
 
                 self.fully_expanded -= 1
+                if hasattr(child, "evicted"):
+                    # Pruned by 'evict': search it again from the top.
+                    del child.evicted
+                    self.fully_expanded = 0
+                    self.caught_up = True
                 self.tree_depth = self.game_tree.height
                 self.pieces += 1
 
+        self.pondering = False
+        self.node_count = self.number_nodes()
+        self.memory_limited = False
+        self.evicted_depth = None
+
         for board in TRANSPOSITION_TABLE.keys():
             if len(board.available_positions) >= 63 - self.pieces:
                 del TRANSPOSITION_TABLE[board]
 
+    def principal_variation(self):
+        """
+        Follows the best scored child from the root as far as the scores go.
+        :return: list <- moves in notation format (eg. ["c4", "e3"])
+        """
+
+        variation = []
+        node = self.game_tree
+        while node.children and \
+                all(hasattr(child, "score") for child in node.children):
+            if (node.depth + self.board.side) % 2 == 0:
+                node = max(node.children, key=lambda c: c.score)
+            else:
+                node = min(node.children, key=lambda c: c.score)
+            variation.append(node.move)
+
+        return variation
+
     def number_nodes(self):
         return len(list(anytree.PreOrderIter(self.game_tree)))
 
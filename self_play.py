@@ -0,0 +1,292 @@
+#! /usr/bin/python
+
+"""
+File: self_play.py
+
+Description: Collects training data by self-play with the project's own
+'Searcher', instead of one position at a time through the 'Edax' pipe. Games
+are played on a pool of worker processes; every position of a game is searched
+to 'DEPTH' plies, and some moves are random (the first 'RANDOM_MOVES', then
+'RANDOM_PERCENTAGE' of them, like 'collect_data_catered.py') so the games
+don't all repeat. Once a game is
+over, its positions are stored with the search score as the label, the
+depth, and the final disc difference as the result.
+
+The label is sigmoid(score / scale), so only evaluators whose scores have a
+known scale can be used (see 'EVALUATORS'); 'ab', 'test' and 'hybrid' score in
+heuristic units and aren't.
+
+Positions are stored as their canonical image (see 'bitboard.canonical') and
+each is stored once: positions already in the file, or in an earlier game,
+are dropped. The records are appended to a packed data file (see
+'packed_dataset.py') every 'SAVE_EVERY' positions, and when interrupted.
+
+NOTE: Every worker should use one BLAS thread (the workers are the
+parallelism), which is set up here before numpy is imported.
+
+Usage: python self_play.py [attribute=value ...]
+
+  computer=NAME         evaluator: nn or pattern (default: 'COMPUTER')
+  depth=N               search depth in plies (default: 'DEPTH')
+  random=P              percentage of random moves (default:
+                        'RANDOM_PERCENTAGE')
+  workers=N             worker processes (default: 'WORKERS')
+  games=N               games to play (default: until interrupted)
+  seed=N                seed for reproducible games (default: 'SEED')
+  data=FILE             packed data file to add to (default: 'DATA_FILE')
+"""
+
+import os
+
+for variable in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+    os.environ.setdefault(variable, "1")
+
+import multiprocessing
+import random
+import signal
+import sys
+import time
+
+import numpy
+
+import bitboard
+import evaluator_nn
+import evaluator_pattern
+import fit_patterns
+import packed_dataset
+import searcher
+
+DATA_FILE = "training_data_self_play.packed"
+
+COMPUTER = "nn"
+DEPTH = 3
+
+RANDOM_MOVES = 1
+RANDOM_PERCENTAGE = 20
+
+WORKERS = 4
+SEED = None
+SAVE_EVERY = 4096  # Positions.
+PENDING_PER_WORKER = 2  # Games queued ahead for every worker.
+
+# name -> (evaluator, score per unit of the logit of the label).
+#   nn      - without 'STAGE_SCALING' (turned off in the workers) the scores
+#             are 100 * the logit of the network, so the label is the
+#             network's own win probability
+#   pattern - fitted on the logit of the labels times
+#             'fit_patterns.LABEL_SCALE', in hundredths
+# Finished games score 100 * the disc difference with both. Not cached: the
+# searcher's transposition table covers a game, and a cache would only grow
+# in every worker.
+EVALUATORS = {
+    "nn": (evaluator_nn.evaluate, 100.0),
+    "pattern": (evaluator_pattern.evaluate, 100.0 * fit_patterns.LABEL_SCALE),
+}
+
+
+def printf(s):
+    sys.stdout.write(s)
+    sys.stdout.flush()
+
+
+def _initialize():
+    # The parent handles interrupts (and saves).
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # Scores with a fixed scale, for the labels.
+    evaluator_nn.STAGE_SCALING = False
+
+
+def play_game(number, computer=COMPUTER, depth=DEPTH,
+              random_percentage=RANDOM_PERCENTAGE, random_moves=RANDOM_MOVES,
+              seed=SEED):
+    """
+    Plays a game against itself.
+    :param number: int <- game number (for the seed)
+    :param computer: str <- name of the evaluator (see 'EVALUATORS')
+    :param depth: int <- search depth in plies
+    :param random_percentage: float <- percentage of random moves
+    :param random_moves: int <- number of random moves at the start
+    :param seed: int <- seed for a reproducible game (or None)
+    :return: numpy.array <- 'packed_dataset' records of the positions
+    """
+
+    if seed is None:
+        generator = random.Random()
+    else:
+        generator = random.Random(hash((seed, number)))
+
+    evaluate, scale = EVALUATORS[computer]
+    engine = searcher.Searcher((evaluate, evaluate))
+
+    positions = []
+    scores = []
+    while not engine.board.is_over():
+        while engine.fully_expanded - int(not engine.caught_up) < depth:
+            engine.expand()
+        engine.update_scores()
+
+        black, white = bitboard.from_board(engine.board)
+        positions.append((black, white, engine.board.side))
+        scores.append(engine.game_tree.score)
+
+        if len(positions) <= random_moves or \
+                generator.random() * 100 < random_percentage:
+            move = generator.choice(engine.board.legal_moves_notation)
+        else:
+            move = engine.best_move()
+        engine.move(move)
+
+    # The next game starts from the top again.
+    searcher.TRANSPOSITION_TABLE.clear()
+
+    black, white = bitboard.from_board(engine.board)
+    records = packed_dataset.empty_records(len(positions))
+    records["black"] = [position[0] for position in positions]
+    records["white"] = [position[1] for position in positions]
+    records["side"] = [position[2] for position in positions]
+    records["depth"] = depth
+    records["result"] = bitboard.popcount(black) - bitboard.popcount(white)
+    records["flags"] = packed_dataset.FLAG_RESULT
+    records["label"] = 1 / (1 + numpy.exp(-numpy.array(scores, dtype=float) /
+                                          scale))
+    return packed_dataset.canonical_records(records)
+
+
+def _keys(records):
+    return zip(records["black"].tolist(), records["white"].tolist(),
+               records["side"].tolist())
+
+
+class Collector:
+    def __init__(self, filename, metadata=None):
+        """
+        Buffers new positions and appends them to a packed data file.
+        :param filename: str <- packed data file (created if needed)
+        :param metadata: dict <- header metadata if the file is created
+        """
+
+        self.filename = filename
+        self.metadata = metadata
+        self.pending = []
+        self.pending_count = 0
+
+        self.seen = set()
+        if os.path.exists(filename):
+            self.seen.update(_keys(packed_dataset.load(filename)))
+        self.existing = len(self.seen)
+
+        self.games = 0
+        self.positions = 0
+        self.repeated = 0
+
+    def add(self, records):
+        """
+        Adds the positions of a game (those not seen before).
+        :param records: numpy.array <- 'packed_dataset' records
+        :return: None
+        """
+
+        new = []
+        for index, key in enumerate(_keys(records)):
+            if key not in self.seen:
+                self.seen.add(key)
+                new.append(index)
+
+        self.games += 1
+        self.positions += len(new)
+        self.repeated += len(records) - len(new)
+        self.pending.append(records[new])
+        self.pending_count += len(new)
+
+        if self.pending_count >= SAVE_EVERY:
+            self.save()
+
+    def save(self):
+        """
+        Appends the buffered positions to the file.
+        :return: None
+        """
+
+        if not self.pending_count:
+            return
+
+        records = numpy.concatenate(self.pending)
+        if os.path.exists(self.filename):
+            packed_dataset.append_records(records, self.filename)
+        else:
+            packed_dataset.save_records(records, self.filename, self.metadata)
+        self.pending = []
+        self.pending_count = 0
+
+
+if __name__ == "__main__":
+    computer = COMPUTER
+    depth = DEPTH
+    random_percentage = RANDOM_PERCENTAGE
+    workers = WORKERS
+    games = None
+    seed = SEED
+    data_file = DATA_FILE
+    for argument in sys.argv[1:]:
+        attribute, value = argument.split("=")
+        if attribute == "computer":
+            computer = value
+        elif attribute == "depth":
+            depth = int(value)
+        elif attribute == "random":
+            random_percentage = float(value)
+        elif attribute == "workers":
+            workers = int(value)
+        elif attribute == "games":
+            games = int(value)
+        elif attribute == "seed":
+            seed = int(value)
+        elif attribute == "data":
+            data_file = value
+
+    if computer not in EVALUATORS:
+        printf("'{}' not a valid argument for 'computer'; choose from {} "
+               "(the others have no score scale for the labels)\n".format(
+                   computer, sorted(EVALUATORS.keys())))
+        exit(1)
+
+    printf("Loading data file... ")
+    collector = Collector(data_file, metadata={
+        "source": "self_play.py", "computer": computer, "depth": depth,
+        "random_percentage": random_percentage, "canonical": True})
+    printf("Done ({} positions)\n".format(collector.existing))
+    printf("Playing with {} workers :: computer={} :: depth={} :: "
+           "random={}%\n".format(workers, computer, depth, random_percentage))
+
+    pool = multiprocessing.Pool(workers, _initialize)
+    pending = []
+    number = 0
+    start_time = time.time()
+    try:
+        while pending or games is None or number < games:
+            while len(pending) < PENDING_PER_WORKER * workers and \
+                    (games is None or number < games):
+                pending.append(pool.apply_async(play_game, (
+                    number, computer, depth, random_percentage, RANDOM_MOVES,
+                    seed)))
+                number += 1
+
+            # Oldest first, so the file only depends on the seed. A timeout
+            # keeps 'get' interruptible.
+            collector.add(pending.pop(0).get(10 ** 6))
+
+            elapsed = time.time() - start_time
+            printf("Game: {} :: {} new positions ({} repeated) :: {} positions"
+                   "/hour\n".format(collector.games, collector.positions,
+                                    collector.repeated,
+                                    int(3600 * collector.positions / elapsed)))
+        pool.close()
+
+    except KeyboardInterrupt:
+        printf("\nKeyboardInterrupt: saving data... ")
+        pool.terminate()
+
+    finally:
+        collector.save()
+        pool.join()
+        printf("Done :: dataset size: {}\n".format(len(collector.seen)))
@@ -0,0 +1,77 @@
+"""
+File: test_searcher.py
+
+Description: Regression tests for 'searcher.py'. Run from the top directory
+with: python -m unittest discover tests
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bitboard
+import search_thread
+import searcher
+
+
+def evaluate(board):
+    # Discs and mobility: cheap, and different enough between moves for the
+    # eviction to pick some subtrees.
+    black, white = bitboard.from_board(board)
+    mobility = bitboard.popcount(bitboard.legal_moves(black, white)) - \
+        bitboard.popcount(bitboard.legal_moves(white, black))
+    return 100 * (bitboard.popcount(black) - bitboard.popcount(white)) + \
+        7 * mobility
+
+
+class EvictionTest(unittest.TestCase):
+    def tearDown(self):
+        searcher.TRANSPOSITION_TABLE.clear()
+
+    def test_move_into_evicted_subtree(self):
+        for max_nodes in (300, 1500, 3000):
+            engine = searcher.Searcher((evaluate, evaluate),
+                                       max_nodes=max_nodes)
+            for _ in xrange(2):
+                engine.expand()
+                engine.update_scores()
+                engine.move(engine.best_move())
+            for _ in xrange(5):
+                engine.expand()
+                engine.update_scores()
+
+            evicted = [child.move for child in engine.game_tree.children
+                       if hasattr(child, "evicted")]
+            self.assertTrue(evicted, "nothing evicted with {} nodes".format(
+                max_nodes))
+
+            engine.move(evicted[0])
+            engine.update_scores()
+            self.assertIn(engine.best_move(),
+                          engine.board.legal_moves_notation)
+            engine.expand()
+            engine.update_scores()
+            self.assertTrue(engine.game_tree.children)
+
+    def test_ponder_within_budget(self):
+        # Pondering has no time limit, so only the node budget ends it.
+        for max_nodes in (300, 2000, 6000):
+            engine = searcher.Searcher((evaluate, evaluate),
+                                       max_nodes=max_nodes)
+            engine.move(engine.best_move())
+
+            ponder = search_thread.start_ponder(engine)
+            self.assertTrue(ponder.wait(120), "still pondering with {} nodes"
+                            .format(max_nodes))
+            self.assertIsNone(ponder.error)
+
+            self.assertTrue(engine.memory_limited or engine.caught_up)
+            self.assertLessEqual(engine.node_count, max_nodes)
+            self.assertEqual(engine.node_count, engine.number_nodes())
+            self.assertGreater(engine.fully_expanded, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
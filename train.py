@@ -4,44 +4,51 @@
 file: train.py
 
 Description: Simple training 'algorithm' using the 'neural_network.py' module.
+Validation and plotting are done by 'validate.py', in another process, from
+the checkpoints (with 'VALIDATE' it's started from here).
 """
 
 import sys
 
 sys.stdout.write("Importing modules.")
 sys.stdout.flush()
-import datafile_manager
+import batch_pipeline
+import checkpoint
 import neural_network
-import test
+import packed_dataset
 
 sys.stdout.write(".")
 sys.stdout.flush()
 
 import cPickle
 import numpy
-import random
-import math
+import os
+import subprocess
 
 sys.stdout.write(".")
 sys.stdout.flush()
 
-try:
-    GRAPH = True
-    import pylab
-except ImportError:
-    GRAPH = False
-
 sys.stdout.write(" Done\n")
 sys.stdout.flush()
 
 LOAD_INSTANCE = False
-LOAD_FILE = "network_save.pkl"
-SAVE_FILE = "network_temp.pkl"
-INTERMEDIATE_SAVE_FILE = "network_shorttemp.pkl"
-SECONDARY_SAVE_FILE = "network_longtemp.pkl"
-DATA_FILE = "training_data.txt"
+LOAD_FILE = "network_save.weights"  # A weights file (or an older pickle).
+# Checkpoints are weights files written in the background (see
+# 'checkpoint.py'); "{iteration}" makes a series, of which the newest
+# 'SECONDARY_KEEP' are kept.
+SAVE_FILE = "network_temp.weights"
+INTERMEDIATE_SAVE_FILE = "network_shorttemp.weights"
+SECONDARY_SAVE_FILE = "checkpoints/network_{iteration}.weights"
+SECONDARY_KEEP = 10
+# A packed dataset (see 'packed_dataset.py'), or a text one to convert.
+DATA_FILE = "training_data.packed"
+# Only train on positions with this many empties, as (fewest, most), for one of
+# the 'PHASE_NETWORKS' of 'evaluator_nn.py' (None for every position).
+EMPTIES_RANGE = None
 
 BATCH_SIZE = 256
+DATA_WORKERS = 2  # Threads preparing batches (see 'batch_pipeline.py').
+AUGMENT = True  # Random symmetry of every position.
 ITERATIONS_PER_BATCH = 1
 HIDDEN_LAYERS = (256, 256, 64)
 
@@ -55,10 +62,9 @@ BETAx = lambda x: x ** (0.5 ** (1.0/HALF_LIFE))
 BATCH_SIZEx = lambda x: int(1.0 * x)
 
 VERBOSE_PER_EPOCH = 100
-LOTS_GRAPH = True
 
-TEST = False
-TEST_PER_EPOCH = 1
+# Run 'validate.py' (as its own process) alongside training.
+VALIDATE = False
 
 
 def printf(s):
@@ -66,28 +72,12 @@ def printf(s):
     sys.stdout.flush()
 
 
-def convert_to_input(pieces):
-    converted = []
-    for row in pieces[:-1]:
-        for piece in row:
-            if piece == "X":
-                converted += [1, 0]
-            elif piece == "O":
-                converted += [0, 1]
-            else:
-                converted += [0, 0]
-
-    if pieces[-1] == "X":
-        converted += [1, 0]
-    else:
-        converted += [0, 1]
-
-    return converted
-
-
 if __name__ == "__main__":
-    if LOAD_INSTANCE:
-        f = open(LOAD_FILE, "r")
+    if LOAD_INSTANCE and LOAD_FILE.endswith(".weights"):
+        # The velocities aren't saved, momentum starts again.
+        brain = neural_network.load(LOAD_FILE, mmap=False)
+    elif LOAD_INSTANCE:
+        f = open(LOAD_FILE, "rb")
         brain = cPickle.load(f)
         f.close()
     else:
@@ -98,38 +88,39 @@ if __name__ == "__main__":
 
     try:
         printf("Loading data file... ")
-        data = datafile_manager.load_data(DATA_FILE)
-        printf("Done\n")
+        records = packed_dataset.load(DATA_FILE)
+        if EMPTIES_RANGE is not None:
+            records = packed_dataset.select_empties(records, *EMPTIES_RANGE)
+        printf("Done ({} positions)\n".format(len(records)))
     except IOError:
         printf("Data file not found, quitting... \n")
         exit(0)
 
+    validator = writer = pipeline = None
     try:
-        if GRAPH:
-            pylab.xlabel("Iterations")
-            pylab.ylabel("Accuracy (%)")
-        positions = data.keys()
-        GRAPH_FREQUENCY = len(data.keys()) / BATCH_SIZE + 1
+        if VALIDATE:
+            validator = subprocess.Popen([sys.executable, os.path.join(
+                os.path.dirname(os.path.abspath(__file__)), "validate.py")])
+        writer = checkpoint.CheckpointWriter()
+        pipeline = batch_pipeline.BatchPipeline(records, BATCH_SIZE,
+                                                workers=DATA_WORKERS,
+                                                augment=AUGMENT).start()
+        VERBOSE_FREQUENCY = max(len(records) / BATCH_SIZE / VERBOSE_PER_EPOCH, 1)
         iteration = 0
 
         while True:
 
             spacer = "=" * 15
             printf(spacer + " EPOCH: {} ".format(
-                round(float(brain.iteration) / (len(data) / BATCH_SIZE), 1))
+                round(float(brain.iteration) / (len(records) / BATCH_SIZE), 1))
                    + spacer + "\n")
             printf("Last accuracy: {}\n".format(brain.error))
 
-            random.shuffle(positions)
-            batches = [positions[n: n + BATCH_SIZE]
-                       for n in xrange(0, len(data), BATCH_SIZE)]
             error = 0
+            pipeline.reset_stats()
 
-            for batch in batches:
-                inputs = numpy.array(map(convert_to_input, batch),
-                                     dtype=numpy.float32)
-                outputs = numpy.array([[data[position]] for position in batch],
-                                      dtype=numpy.float32)
+            for _ in xrange((len(records) + BATCH_SIZE - 1) // BATCH_SIZE):
+                _, inputs, outputs = pipeline.next()
 
                 error += brain.train(inputs, outputs,
                                      iterations=ITERATIONS_PER_BATCH,
@@ -139,12 +130,7 @@ if __name__ == "__main__":
 
                 iteration += ITERATIONS_PER_BATCH
 
-                if iteration % (GRAPH_FREQUENCY / VERBOSE_PER_EPOCH) == 0:
-                    current_error = error / ((iteration - 1) % GRAPH_FREQUENCY)
-                    if LOTS_GRAPH:
-                        pylab.scatter(brain.iteration, brain.error, c="b")
-                        pylab.pause(10 ** -3)
-
+                if iteration % VERBOSE_FREQUENCY == 0:
                     deviation = 0
                     for weights in brain.weights_list:
                         deviation += numpy.std(weights)
@@ -152,45 +138,24 @@ if __name__ == "__main__":
                     printf("Iteration: {} :: Accuracy: {}% :: Weights deviation: {}\n".format(
                         brain.iteration, round(brain.error, 2), round(deviation, 4)))
 
-                if iteration % (GRAPH_FREQUENCY / TEST_PER_EPOCH) == 0 and TEST:
-                    printf("Testing network... ")
-                    test_accuracy = test.test(brain)
-                    printf("Done\n")
-                    if LOTS_GRAPH:
-                        pylab.scatter(brain.iteration, test_accuracy, c="r")
-                        pylab.pause(10 ** -3)
-
-                    printf("Iteration: {} :: Test Accuracy: {}%\n".format(
-                        brain.iteration, round(test_accuracy, 2)))
-
-                if iteration % GRAPH_FREQUENCY == 0 and GRAPH:
-                    pylab.scatter(brain.iteration, brain.error, c="b")
-                    pylab.pause(10 ** -3)
-
                 if brain.iteration % 1000 == 0:
-                    printf("Saving intermediate network... ")
-                    f = open(INTERMEDIATE_SAVE_FILE, "w")
-                    cPickle.dump(brain, f, cPickle.HIGHEST_PROTOCOL)
-                    f.close()
-                    printf("Done\n")
+                    writer.save(brain, INTERMEDIATE_SAVE_FILE)
 
                 if brain.iteration % 100000 == 0:
-                    printf("Saving network as secondary... ")
-                    f = open(SECONDARY_SAVE_FILE, "w")
-                    cPickle.dump(brain, f, cPickle.HIGHEST_PROTOCOL)
-                    f.close()
-                    printf("Done\n")
+                    printf("Saving network as {}\n".format(writer.save(
+                        brain, SECONDARY_SAVE_FILE, keep=SECONDARY_KEEP)))
 
+            printf("Data pipeline: {}\n".format(pipeline.report()))
             printf("Iteration: {}  ->  ".format(brain.iteration))
             printf("Saving network... ")
-            f = open(SAVE_FILE, "w")
-            cPickle.dump(brain, f, cPickle.HIGHEST_PROTOCOL)
-            f.close()
-            printf("Done\n")
+            writer.save(brain, SAVE_FILE)
+            printf("Queued\n")
+            printf("Checkpoints: {}\n".format(writer.report()))
 
             ALPHA = ALPHAx(ALPHA)
             BETA = BETAx(BETA)
             BATCH_SIZE = BATCH_SIZEx(BATCH_SIZE)
+            pipeline.batch_size = BATCH_SIZE
 
             print "New hyper-perameters: "
             print "    BATCH_SIZE: ", BATCH_SIZE
@@ -198,16 +163,20 @@ if __name__ == "__main__":
             print "    BETA: ", BETA
 
     except KeyboardInterrupt:
-        brain.iteration = int(round(brain.iteration / 100.0)) * 100
-
-        f = open(SAVE_FILE, "w")
-        cPickle.dump(brain, f, cPickle.HIGHEST_PROTOCOL)
-        f.close()
+        if writer is not None:
+            brain.iteration = int(round(brain.iteration / 100.0)) * 100
+            writer.save(brain, SAVE_FILE)
+
+    finally:
+        if pipeline is not None:
+            pipeline.stop()
+        if writer is not None:
+            writer.close()
+        if validator is not None:
+            validator.terminate()
 
     print "Final hyper-perameters: "
     print "    BATCH_SIZE: ", BATCH_SIZE
     print "    ALPHA: ", ALPHA
     print "    BETA: ", BETA
-
-    pylab.show()
     printf("\n")
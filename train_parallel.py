@@ -0,0 +1,315 @@
+#! /usr/bin/python
+
+"""
+File: train_parallel.py
+
+Description: Data parallel version of 'train.py' for many-core machines. Every
+batch is split into one shard per worker process; the workers encode their
+shard straight from the (memory-mapped, so shared) dataset and compute its
+gradients ('NeuralNetwork.compute_gradients') into shared memory, and the
+parent adds them up and applies the momentum update to weights which are
+themselves in shared memory, so the workers see the new weights without
+anything being copied or sent.
+
+The gradients of 'compute_gradients' are sums over the batch, so the sum of
+the shard gradients is exactly the gradient of the whole batch: with one
+worker (and no dropout or augmentation) this trains the same network as
+'train.py'. With a seed, the shuffles, dropout masks and symmetries only
+depend on the seed, the batch and the worker, so runs with the same seed and
+number of workers are identical.
+
+NOTE: Every worker should use one BLAS thread (the workers are the
+parallelism), which is set up here before numpy is imported; run this as a
+script rather than importing it after numpy.
+
+Usage: python train_parallel.py [attribute=value ...]
+
+  workers=N     worker processes (default: 'WORKERS')
+  seed=N        seed for a reproducible run (default: 'SEED')
+  data=FILE     packed (or text) data file (default: 'DATA_FILE')
+  epochs=N      epochs to train for (default: until interrupted)
+  empties=L-H   only positions with L to H empties (default: 'EMPTIES_RANGE')
+  hidden=A,B    hidden layer sizes (default: 'HIDDEN_LAYERS')
+  save=FILE     checkpoint file to write (default: 'SAVE_FILE')
+"""
+
+import os
+
+for variable in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+    os.environ.setdefault(variable, "1")
+
+import cPickle
+import multiprocessing
+import signal
+import sys
+import time
+
+import numpy
+
+import checkpoint
+import encoding
+import neural_network
+import packed_dataset
+
+LOAD_INSTANCE = False
+LOAD_FILE = "network_save.weights"  # A weights file (or an older pickle).
+SAVE_FILE = "network_temp.weights"  # See 'checkpoint.py'.
+DATA_FILE = "training_data.packed"
+EMPTIES_RANGE = None  # See 'train.py'.
+
+WORKERS = 4
+SEED = None
+
+BATCH_SIZE = 256
+HIDDEN_LAYERS = (256, 256, 64)
+AUGMENT = True  # Random symmetry of every position.
+
+ALPHA = 0.0016
+DROPOUT_PERCENTAGE = 0.5
+BETA = 0.5
+
+VERBOSE_PER_EPOCH = 10
+
+
+def printf(s):
+    sys.stdout.write(s)
+    sys.stdout.flush()
+
+
+def _shared_arrays(shapes, copies=1):
+    """
+    Allocates float32 arrays in shared memory (inherited by forked processes).
+    :param shapes: list <- shapes of the arrays
+    :param copies: int <- number of sets of arrays
+    :return: tuple -> (flat (copies, total size) array, list of 'copies'
+        lists of arrays of the shapes, views of the flat array)
+    """
+
+    sizes = [int(numpy.prod(shape)) for shape in shapes]
+    raw = multiprocessing.RawArray("f", copies * sum(sizes))
+    flat = numpy.frombuffer(raw, dtype=numpy.float32).reshape(copies,
+                                                               sum(sizes))
+    sets = []
+    for copy in flat:
+        arrays = []
+        offset = 0
+        for shape, size in zip(shapes, sizes):
+            arrays.append(copy[offset: offset + size].reshape(shape))
+            offset += size
+        sets.append(arrays)
+    return flat, sets
+
+
+def _random_state(seed, *key):
+    if seed is None:
+        return numpy.random.RandomState()
+    return numpy.random.RandomState((seed,) + key)
+
+
+def _work(index, connection, records, weights, gradients, augment, seed):
+    # The parent handles interrupts (and stops the workers).
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # Forked: the generator state is the parent's, start afresh.
+    numpy.random.seed()
+    network = neural_network.NeuralNetwork(weights_list=weights)
+    # The gradients go straight into this worker's shared arrays.
+    network._training_state()["gradients"] = gradients
+
+    while True:
+        task = connection.recv()
+        if task is None:
+            break
+        step, indices, dropout_percentage = task
+
+        if len(indices) == 0:
+            for gradient in gradients:
+                gradient[...] = 0.
+            connection.send(0.)
+            continue
+
+        batch = records[indices]
+        inputs = packed_dataset.to_input(batch)
+        if augment:
+            transforms = _random_state(seed, step, index, 0).randint(
+                len(encoding.SYMMETRIES), size=len(inputs))
+            encoding.transform_inputs(inputs, transforms)
+
+        if seed is not None:
+            numpy.random.seed((seed, step, index, 1))
+        _, accuracy = network.compute_gradients(
+            inputs, packed_dataset.to_output(batch), dropout_percentage)
+        connection.send(accuracy)
+
+    connection.close()
+
+
+class ParallelTrainer:
+    def __init__(self, brain, records, workers=WORKERS, augment=AUGMENT,
+                 seed=SEED):
+        """
+        Data parallel training of a network.
+        :param brain: neural_network.NeuralNetwork() <- network to train (its
+            weights are moved to shared memory)
+        :param records: numpy.array <- 'packed_dataset' records
+        :param workers: int <- number of worker processes
+        :param augment: bool <- apply a random symmetry to every position
+        :param seed: int <- seed for a reproducible run (or None)
+        """
+
+        self.brain = brain
+        self.records = records
+        self.seed = seed
+        self.steps = 0
+
+        shapes = [weights.shape for weights in brain.weights_list]
+        _, (weights,) = _shared_arrays(shapes)
+        for shared, current in zip(weights, brain.weights_list):
+            shared[...] = current
+        brain.weights_list = weights
+        brain._training = None
+        brain._inference = None
+
+        self.gradients, worker_gradients = _shared_arrays(shapes, workers)
+        # The sum of the gradients, laid out the same way.
+        self.total_flat, (self.total,) = _shared_arrays(shapes)
+
+        self.connections = []
+        self.processes = []
+        for index in xrange(workers):
+            parent_end, worker_end = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                target=_work, args=(index, worker_end, records, weights,
+                                    worker_gradients[index], augment, seed))
+            process.daemon = True
+            process.start()
+            worker_end.close()
+            self.connections.append(parent_end)
+            self.processes.append(process)
+
+    def batches(self, epoch, batch_size=BATCH_SIZE):
+        """
+        Shuffles the records for an epoch.
+        :param epoch: int <- epoch number (for the seed)
+        :param batch_size: int <- positions per batch
+        :return: list <- sorted index arrays, one per batch
+        """
+
+        order = _random_state(self.seed, epoch).permutation(len(self.records))
+        return [numpy.sort(order[n: n + batch_size])
+                for n in xrange(0, len(order), batch_size)]
+
+    def step(self, indices, alpha=ALPHA, beta=BETA,
+             dropout_percentage=DROPOUT_PERCENTAGE):
+        """
+        Trains on one batch.
+        :param indices: numpy.array <- indices of the records of the batch
+        :param alpha: float <- learning rate
+        :param beta: float <- momentum
+        :param dropout_percentage: float <- fraction of hidden units to drop
+        :return: float <- accuracy (%) on the batch
+        """
+
+        shards = numpy.array_split(indices, len(self.connections))
+        for connection, shard in zip(self.connections, shards):
+            connection.send((self.steps, shard, dropout_percentage))
+        accuracies = [connection.recv() for connection in self.connections]
+
+        numpy.sum(self.gradients, axis=0, out=self.total_flat[0])
+        self.brain.apply_gradients(self.total, alpha, beta)
+        self.brain.iteration += 1
+        self.steps += 1
+
+        accuracy = sum(a * len(shard) for a, shard in zip(accuracies, shards))
+        return self.brain._finish_training(accuracy / len(indices))
+
+    def close(self):
+        for connection, process in zip(self.connections, self.processes):
+            try:
+                connection.send(None)
+            except (IOError, EOFError):
+                process.terminate()  # Already dead (or dying).
+            connection.close()
+        for process in self.processes:
+            process.join()
+
+
+if __name__ == "__main__":
+    workers = WORKERS
+    seed = SEED
+    epochs = None
+    for argument in sys.argv[1:]:
+        attribute, value = argument.split("=")
+        if attribute == "workers":
+            workers = int(value)
+        elif attribute == "seed":
+            seed = int(value)
+        elif attribute == "data":
+            DATA_FILE = value
+        elif attribute == "epochs":
+            epochs = int(value)
+        elif attribute == "empties":
+            EMPTIES_RANGE = tuple(int(n) for n in value.split("-"))
+        elif attribute == "hidden":
+            HIDDEN_LAYERS = tuple(int(n) for n in value.split(","))
+        elif attribute == "save":
+            SAVE_FILE = value
+
+    if LOAD_INSTANCE and LOAD_FILE.endswith(".weights"):
+        # The velocities aren't saved, momentum starts again.
+        brain = neural_network.load(LOAD_FILE, mmap=False)
+    elif LOAD_INSTANCE:
+        f = open(LOAD_FILE, "rb")
+        brain = cPickle.load(f)
+        f.close()
+    else:
+        if seed is not None:
+            numpy.random.seed(seed)
+        brain = neural_network.NeuralNetwork(
+            input_layer_size=encoding.INPUT_SIZE,
+            hidden_layer_sizes=HIDDEN_LAYERS, output_layer_size=1)
+
+    try:
+        printf("Loading data file... ")
+        records = packed_dataset.load(DATA_FILE)
+        if EMPTIES_RANGE is not None:
+            records = packed_dataset.select_empties(records, *EMPTIES_RANGE)
+        printf("Done ({} positions)\n".format(len(records)))
+    except IOError:
+        printf("Data file not found, quitting... \n")
+        exit(0)
+
+    trainer = ParallelTrainer(brain, records, workers=workers, seed=seed)
+    writer = checkpoint.CheckpointWriter()
+    printf("Training with {} workers\n".format(workers))
+
+    epoch = 0
+    try:
+        while epochs is None or epoch < epochs:
+            spacer = "=" * 15
+            printf(spacer + " EPOCH: {} ".format(epoch) + spacer + "\n")
+
+            batches = trainer.batches(epoch)
+            report_frequency = max(len(batches) // VERBOSE_PER_EPOCH, 1)
+            start_time = time.time()
+            samples = 0
+
+            for number, indices in enumerate(batches):
+                trainer.step(indices)
+                samples += len(indices)
+
+                if (number + 1) % report_frequency == 0:
+                    printf("Iteration: {} :: Accuracy: {}% :: {} samples/sec"
+                           "\n".format(brain.iteration, round(brain.error, 2),
+                                       int(samples /
+                                           (time.time() - start_time))))
+
+            writer.save(brain, SAVE_FILE)
+            printf("Checkpoints: {}\n".format(writer.report()))
+            epoch += 1
+
+    except KeyboardInterrupt:
+        writer.save(brain, SAVE_FILE)
+
+    finally:
+        writer.close()
+        trainer.close()
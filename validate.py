@@ -0,0 +1,262 @@
+#! /usr/bin/python
+
+"""
+File: validate.py
+
+Description: Validation (and plotting) for training, out of the training
+process. This watches the checkpoint files written by 'train.py' (see
+'checkpoint.py'), evaluates every new checkpoint on a held-out packed dataset
+with batched inference, and appends a line of metrics to a log file, which
+can be followed with 'tail -f' while training runs (or plotted with 'plot=1').
+The trainer never waits for any of this.
+
+Log columns (tab separated, after a header line):
+  time        - when the checkpoint was evaluated
+  checkpoint  - file of the checkpoint
+  iteration   - training iteration of the checkpoint
+  training    - training accuracy (%, smoothed) saved with the checkpoint
+  accuracy    - validation accuracy (%, the same measure as training)
+  mae, mse    - mean absolute and squared error of the win probability
+  sign        - fraction of positions on the right side of 50%
+  seconds     - time taken by the evaluation
+
+Usage: python validate.py [attribute=value ...]
+
+  data=FILE        held-out packed data file (default: 'VALIDATION_FILE')
+  log=FILE         log file to append to (default: 'LOG_FILE')
+  checkpoints=A,B  checkpoint files (or glob patterns) to watch (default:
+                   'CHECKPOINTS')
+  empties=L-H      only the positions with L to H empties (for a network of
+                   'PHASE_NETWORKS' in 'evaluator_nn.py')
+  once=1           evaluate the current checkpoints and quit
+  plot=1           plot the log as it grows (needs pylab)
+  split=FILE       instead: move 'VALIDATION_FRACTION' of a packed data file
+                   to 'data' and the rest to FILE with "_train" added
+"""
+
+import glob
+import os
+import sys
+import time
+
+import numpy
+
+import neural_network
+import packed_dataset
+
+VALIDATION_FILE = "validation_data.packed"
+LOG_FILE = "validation_log.txt"
+CHECKPOINTS = [
+    "network_shorttemp.weights",
+    "network_temp.weights",
+    "checkpoints/network_*.weights",
+]
+
+VALIDATION_FRACTION = 0.05
+SEED = 0
+
+BATCH_SIZE = 4096
+POLL_INTERVAL = 5
+
+COLUMNS = ("time", "checkpoint", "iteration", "training", "accuracy", "mae",
+           "mse", "sign", "seconds")
+
+
+def printf(s):
+    sys.stdout.write(s)
+    sys.stdout.flush()
+
+
+def evaluate(brain, records):
+    """
+    Evaluates a network on a dataset.
+    :param brain: neural_network.NeuralNetwork() <- network to evaluate
+    :param records: numpy.array <- 'packed_dataset' records
+    :return: dict <- "accuracy", "mae", "mse" and "sign"
+    """
+
+    absolute = squared = training_error = right_side = 0.0
+    for n in xrange(0, len(records), BATCH_SIZE):
+        batch = records[n: n + BATCH_SIZE]
+        labels = packed_dataset.to_output(batch)[:, 0].astype(numpy.float64)
+        outputs = brain.infer(packed_dataset.to_input(batch))[:, 0]
+
+        errors = labels - outputs
+        absolute += numpy.sum(numpy.abs(errors))
+        squared += numpy.sum(errors ** 2)
+        # The accuracy printed by 'NeuralNetwork.train'.
+        training_error += numpy.sum(numpy.abs((errors + 1) ** 2 - 1))
+        right_side += numpy.sum((outputs > 0.5) == (labels > 0.5))
+
+    count = float(len(records))
+    return {
+        "accuracy": 100 * (1 - training_error / count),
+        "mae": absolute / count,
+        "mse": squared / count,
+        "sign": right_side / count,
+    }
+
+
+def checkpoint_files():
+    files = []
+    for pattern in CHECKPOINTS:
+        files += sorted(glob.glob(pattern))
+    return files
+
+
+def append_log(log_file, values):
+    new = not os.path.exists(log_file)
+    f = open(log_file, "a")
+    if new:
+        f.write("\t".join(COLUMNS) + "\n")
+    f.write("\t".join(str(values[column]) for column in COLUMNS) + "\n")
+    f.close()
+
+
+def read_log(log_file):
+    """
+    Reads the log back.
+    :param log_file: str <- log file
+    :return: list <- one dict (column -> string) per line
+    """
+
+    if not os.path.exists(log_file):
+        return []
+    f = open(log_file, "r")
+    lines = f.read().splitlines()[1:]
+    f.close()
+    return [dict(zip(COLUMNS, line.split("\t"))) for line in lines if line]
+
+
+def validate(path, records, log_file):
+    """
+    Evaluates one checkpoint and logs it.
+    :param path: str <- checkpoint (weights file)
+    :param records: numpy.array <- held-out records
+    :param log_file: str <- log file
+    :return: dict <- the logged values
+    """
+
+    start_time = time.time()
+    brain = neural_network.load(path)
+    values = evaluate(brain, records)
+    values.update({
+        "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "checkpoint": path,
+        "iteration": brain.iteration,
+        "training": brain.error,
+        "seconds": round(time.time() - start_time, 3),
+    })
+    append_log(log_file, values)
+    return values
+
+
+def plot(log_file):
+    import pylab
+
+    entries = read_log(log_file)
+    pylab.clf()
+    pylab.xlabel("Iterations")
+    pylab.ylabel("Accuracy (%)")
+    for column, colour in (("training", "b"), ("accuracy", "r")):
+        points = [(int(entry["iteration"]), float(entry[column]))
+                  for entry in entries if entry[column] != "None"]
+        if points:
+            pylab.scatter(*zip(*points), c=colour, label=column)
+    pylab.legend(loc="lower right")
+    pylab.pause(10 ** -3)
+
+
+def split(data_file, validation_file, fraction=VALIDATION_FRACTION,
+          seed=SEED):
+    """
+    Splits a packed data file into training and held-out files.
+    :param data_file: str <- packed file to split (left as it is)
+    :param validation_file: str <- held-out file to write
+    :param fraction: float <- fraction of the records to hold out
+    :param seed: int <- random seed
+    :return: tuple -> (training file, training count, held-out count)
+    """
+
+    records = packed_dataset.load(data_file)
+    order = numpy.random.RandomState(seed).permutation(len(records))
+    held_out = numpy.sort(order[:int(round(fraction * len(records)))])
+    training = numpy.sort(order[len(held_out):])
+
+    training_file = os.path.splitext(data_file)[0] + "_train.packed"
+    packed_dataset.save_records(records[training], training_file)
+    packed_dataset.save_records(records[held_out], validation_file)
+    return training_file, len(training), len(held_out)
+
+
+if __name__ == "__main__":
+    data_file = VALIDATION_FILE
+    log_file = LOG_FILE
+    once = False
+    plotting = False
+    split_file = None
+    empties_range = None
+    for argument in sys.argv[1:]:
+        attribute, value = argument.split("=")
+        if attribute == "data":
+            data_file = value
+        elif attribute == "log":
+            log_file = value
+        elif attribute == "checkpoints":
+            CHECKPOINTS = value.split(",")
+        elif attribute == "empties":
+            empties_range = tuple(int(n) for n in value.split("-"))
+        elif attribute == "once":
+            once = bool(int(value))
+        elif attribute == "plot":
+            plotting = bool(int(value))
+        elif attribute == "split":
+            split_file = value
+
+    if split_file is not None:
+        training_file, training_count, held_out_count = split(split_file,
+                                                              data_file)
+        printf("Wrote {} positions to '{}' and {} to '{}'\n".format(
+            training_count, training_file, held_out_count, data_file))
+        exit(0)
+
+    try:
+        records = packed_dataset.load(data_file)
+    except IOError:
+        printf("Validation file not found, quitting... \n")
+        exit(0)
+    if empties_range is not None:
+        records = packed_dataset.select_empties(records, *empties_range)
+    printf("Validating on {} positions from '{}', logging to '{}'\n".format(
+        len(records), data_file, log_file))
+
+    seen = {}
+    try:
+        while True:
+            for path in checkpoint_files():
+                try:
+                    stamp = os.stat(path)
+                except OSError:
+                    continue  # Removed (see 'keep' in 'checkpoint.py').
+                stamp = (stamp.st_mtime, stamp.st_size)
+                if seen.get(path) == stamp:
+                    continue
+                seen[path] = stamp
+
+                try:
+                    values = validate(path, records, log_file)
+                except (IOError, ValueError) as error:
+                    printf("Skipping '{}': {}\n".format(path, error))
+                    continue
+                printf("Iteration: {} :: Validation accuracy: {}% :: "
+                       "'{}'\n".format(values["iteration"],
+                                       round(values["accuracy"], 2), path))
+                if plotting:
+                    plot(log_file)
+
+            if once:
+                break
+            time.sleep(POLL_INTERVAL)
+
+    except KeyboardInterrupt:
+        pass
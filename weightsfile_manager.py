@@ -1,41 +1,153 @@
 """
 File: weightsfile_manager.py
 
-Description: Helper module for interaction with the weights file.
+Description: Helper module for interaction with the weights file. The weights
+are stored as raw float32 arrays after a small header, each array starting on
+an 'ALIGNMENT' byte boundary, so they can be memory-mapped read-only instead
+of read (and parsed) into private memory: every process mapping the same file
+shares one copy of it in the page cache.
 
-NOTE: This is currently not actually used because the current storage
-implementation is using cPickle (I am very lazy).
+Layout: 'MAGIC', then the version and the header length as little-endian
+uint32s, then the header as JSON (the name, shape and offset of every array,
+and any metadata), then the arrays. The layers are named "layer_0",
+"layer_1", ... and anything else is an extra array (eg. a copy in the layout
+used for inference).
+
+Usage: python weightsfile_manager.py [network .pkl file] [weights file]
+
+Converts a pickled 'NeuralNetwork' to a weights file.
 """
 
+import json
+import struct
+import sys
+
 import numpy
 
+MAGIC = "RVWEIGHT"
+VERSION = 2
+ALIGNMENT = 64
+
+PREFIX = struct.Struct("<II")
+
+
+def _align(n):
+    return (n + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
 
-def save_weights(weight_sets, filename):
-    save_string = ""
-    for weight_set in weight_sets:
-        for weights in weight_set:
-            save_string += " ".join(list(map(str, weights))) + "\n"
-        save_string += "-\n"
+def layer_name(index):
+    return "layer_{}".format(index)
 
-    save_file = open(filename, "w")
-    save_file.write(save_string)
+
+def save_weights(weight_sets, filename, metadata=None, extras=None):
+    """
+    Saves arrays to a weights file.
+    :param weight_sets: list <- the layers (numpy arrays, stored as float32)
+    :param filename: str <- file to write
+    :param metadata: dict <- anything JSON serializable to keep in the header
+    :param extras: dict <- more arrays to store, by name
+    :return: None
+    """
+
+    named = [(layer_name(index), weights)
+             for index, weights in enumerate(weight_sets)]
+    named += sorted((extras or {}).items())
+    named = [(name, numpy.ascontiguousarray(weights, dtype="<f4"))
+             for name, weights in named]
+
+    arrays = []
+    offset = 0
+    for name, weights in named:
+        arrays.append({"name": name, "shape": list(weights.shape),
+                       "offset": offset})
+        offset = _align(offset + weights.nbytes)
+
+    header = json.dumps({"arrays": arrays, "metadata": metadata or {}})
+    data_start = _align(len(MAGIC) + PREFIX.size + len(header))
+
+    save_file = open(filename, "wb")
+    save_file.write(MAGIC + PREFIX.pack(VERSION, len(header)) + header)
+    for (_, weights), array in zip(named, arrays):
+        save_file.seek(data_start + array["offset"])
+        save_file.write(weights.tostring())
+    save_file.truncate(data_start + offset)
     save_file.close()
 
 
-def load_weights(filename):
-    load_file = open(filename, "r")
-    data = load_file.read()
+def read_header(filename):
+    """
+    Reads the header of a weights file.
+    :param filename: str <- file to read
+    :return: dict <- "arrays" (shapes and offsets from "data_start"),
+        "metadata" and "version"
+    """
+
+    load_file = open(filename, "rb")
+    prefix = load_file.read(len(MAGIC) + PREFIX.size)
+    if prefix[:len(MAGIC)] != MAGIC:
+        load_file.close()
+        raise ValueError("'{}' is not a weights file".format(filename))
+
+    version, header_length = PREFIX.unpack(prefix[len(MAGIC):])
+    if version != VERSION:
+        load_file.close()
+        raise ValueError("'{}' has weights file version {} (this reads {})"
+                         .format(filename, version, VERSION))
+
+    header = json.loads(load_file.read(header_length))
     load_file.close()
 
-    weight_sets = data.split("-\n")[:-1]
-    weight_sets = [weights.split("\n")[:-1] for weights in weight_sets]
-    for weight_set in weight_sets:
-        for weights_index in xrange(len(weight_set)):
-            weight_set[weights_index] = map(float, weight_set[weights_index].split())
-    weight_sets = [numpy.array(weights) for weights in weight_sets]
+    header["version"] = version
+    header["data_start"] = _align(len(prefix) + header_length)
+    return header
+
+
+def load_arrays(filename, mmap=True):
+    """
+    Loads every array of a weights file.
+    :param filename: str <- file to read
+    :param mmap: bool <- map the arrays (read-only) instead of reading them
+    :return: tuple -> (dict of float32 numpy arrays by name, header)
+    """
+
+    header = read_header(filename)
+
+    if mmap:
+        data = numpy.memmap(filename, dtype=numpy.uint8, mode="r")
+    else:
+        data = numpy.fromfile(filename, dtype=numpy.uint8)
 
+    arrays = {}
+    for array in header["arrays"]:
+        shape = tuple(array["shape"])
+        start = header["data_start"] + array["offset"]
+        size = int(numpy.prod(shape)) * 4
+        arrays[array["name"]] = data[start: start + size].view("<f4").reshape(
+            shape)
+
+    return arrays, header
+
+
+def load_weights(filename, mmap=True):
+    """
+    Loads the layers of a weights file.
+    :param filename: str <- file to read
+    :param mmap: bool <- map the arrays (read-only) instead of reading them
+    :return: list <- float32 numpy arrays
+    """
+
+    arrays, _ = load_arrays(filename, mmap)
+    weight_sets = []
+    while layer_name(len(weight_sets)) in arrays:
+        weight_sets.append(arrays[layer_name(len(weight_sets))])
     return weight_sets
 
 
 if __name__ == "__main__":
-    pass
+    import cPickle
+
+    f = open(sys.argv[1], "rb")
+    network = cPickle.load(f)
+    f.close()
+
+    network.save(sys.argv[2])